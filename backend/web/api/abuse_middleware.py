@@ -1,8 +1,22 @@
+import asyncio
 import os
+import threading
+import time
+import weakref
 
 import redis
+import redis.asyncio
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.http import JsonResponse
 
+from .cidr_blocklist import ESCALATE_LUA, CidrBlocklist
+from .metrics_custom import (
+    abuse_breaker_open,
+    abuse_middleware_overhead_seconds,
+    abuse_redis_errors_total,
+    abuse_redis_seconds,
+)
+
 REDIS_HOST = os.getenv("ABUSE_REDIS_HOST", "127.0.0.1")
 REDIS_PORT = int(os.getenv("ABUSE_REDIS_PORT", "6379"))
 REDIS_DB = int(os.getenv("ABUSE_REDIS_DB", "1"))
@@ -15,12 +29,171 @@ WINDOW_SECONDS = int(os.getenv("ABUSE_WINDOW_SECONDS", "60"))
 MAX_401 = int(os.getenv("ABUSE_MAX_401", "15"))
 BLOCK_SECONDS = int(os.getenv("ABUSE_BLOCK_SECONDS", "600"))
 
-r = redis.Redis(
+# Local tier (per process). Error bound: another worker's block takes effect
+# here after at most LOCAL_TTL_MS, and a block can trigger up to
+# workers * (FLUSH_EVERY - 1) 401s late. Set both to 0/1 for the old behaviour.
+LOCAL_TTL_MS = int(os.getenv("ABUSE_LOCAL_TTL_MS", "1000"))
+FLUSH_EVERY = max(1, int(os.getenv("ABUSE_FLUSH_EVERY", "5")))
+LOCAL_MAX_IPS = int(os.getenv("ABUSE_LOCAL_MAX_IPS", "100000"))
+
+# Network blocks (cidr_blocklist.py): once ABUSE_CIDR_ESCALATE_HOSTS hosts of
+# one /24 (IPv6 /64) are blocked, the network is blocked too. Only hosts seen
+# from a trusted hop count (REMOTE_ADDR, or the X-Forwarded-For hop reported by
+# a proxy in ABUSE_TRUSTED_PROXIES), so spoofed headers cannot block a network.
+# Each worker polls "abuse:cidr:version" at most every LOCAL_TTL_MS and
+# rebuilds its prefix tree when it changed.
+networks = CidrBlocklist.from_env("abuse", "ABUSE_", block_seconds=BLOCK_SECONDS)
+
+# Redis budget: every call is bounded by the socket timeout, and the breaker
+# stops calling Redis (fail open) once it is slow or failing.
+REDIS_TIMEOUT_MS = int(os.getenv("ABUSE_REDIS_TIMEOUT_MS", "50"))
+REDIS_MAX_CONNECTIONS = int(os.getenv("ABUSE_REDIS_MAX_CONNECTIONS", "32"))
+BREAKER_SLOW_MS = float(os.getenv("ABUSE_BREAKER_SLOW_MS", "20"))
+BREAKER_FAILURES = int(os.getenv("ABUSE_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv("ABUSE_BREAKER_COOLDOWN_SECONDS", "5"))
+
+REDIS_OPTIONS = dict(
     host=REDIS_HOST,
     port=REDIS_PORT,
     db=REDIS_DB,
     decode_responses=True,
+    max_connections=REDIS_MAX_CONNECTIONS,
+    socket_timeout=REDIS_TIMEOUT_MS / 1000.0,
+    socket_connect_timeout=REDIS_TIMEOUT_MS / 1000.0,
+    retry_on_timeout=False,
+    health_check_interval=30,
 )
+pool = redis.ConnectionPool(**REDIS_OPTIONS)
+r = redis.Redis(connection_pool=pool)
+
+# Sorted set ip -> block expiry (epoch seconds), so the active blocks can be
+# listed without SCAN (nginx blocklist sync: manage.py nginx_blocklist).
+BLOCKED_INDEX = "abuse:blocked"
+
+# KEYS[1] = abuse:401:{ip}, KEYS[2] = abuse:block:{ip}, KEYS[3] = abuse:blocked
+# ARGV = delta, window_seconds, max_401, block_seconds, ip
+# Count, start the window on first hit and block on threshold in one round trip.
+COUNT_401_LUA = """
+local delta = tonumber(ARGV[1])
+local count = redis.call('INCRBY', KEYS[1], delta)
+if count == delta then
+  redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+if count >= tonumber(ARGV[3]) then
+  redis.call('SET', KEYS[2], '1', 'EX', ARGV[4])
+  local now = tonumber(redis.call('TIME')[1])
+  redis.call('ZADD', KEYS[3], now + tonumber(ARGV[4]), ARGV[5])
+  redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', now)
+  return 1
+end
+return 0
+"""
+count_401_script = r.register_script(COUNT_401_LUA)
+escalate_script = r.register_script(ESCALATE_LUA)
+
+# redis.asyncio clients for the ASGI path, one per event loop (asyncio
+# connections cannot be shared across loops): loop -> (client, count_401 script, escalate script)
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _async_redis():
+    loop = asyncio.get_running_loop()
+    entry = _async_clients.get(loop)
+    if entry is None:
+        client = redis.asyncio.Redis(connection_pool=redis.asyncio.ConnectionPool(**REDIS_OPTIONS))
+        entry = (client, client.register_script(COUNT_401_LUA), client.register_script(ESCALATE_LUA))
+        _async_clients[loop] = entry
+    return entry
+
+
+class _CircuitBreaker:
+    """
+    Opens after BREAKER_FAILURES consecutive errors or slow calls
+    (> BREAKER_SLOW_MS) and stays open for BREAKER_COOLDOWN_SECONDS. While open,
+    Redis is skipped and the middleware fails open (nothing is blocked, 401s
+    are not counted). After the cooldown the breaker is half-open: exactly one
+    call is let through as a probe while every other call is still skipped.
+    A fast probe closes the breaker; a failed or slow one reopens it for
+    another cooldown. A probe that never reports back (e.g. a cancelled
+    task) is replaced after one cooldown.
+    """
+
+    def __init__(self):
+        self._strikes = 0
+        self._open = False
+        self._open_until = 0.0
+        self._probe_until = 0.0  # half-open: a probe is in flight until then
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        if not self._open:
+            return True
+        now = time.monotonic()
+        if now < self._open_until or now < self._probe_until:
+            return False
+        with self._lock:
+            if not self._open:
+                return True
+            if now < self._open_until or now < self._probe_until:
+                return False
+            self._probe_until = now + BREAKER_COOLDOWN_SECONDS
+            return True
+
+    def call(self, op: str, fn, *args, **kwargs):
+        if not self.allow():
+            return None
+        t0 = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except redis.RedisError:
+            abuse_redis_errors_total.labels(op=op).inc()
+            self._strike()
+            return None
+        self._record(op, time.perf_counter() - t0)
+        return result
+
+    async def acall(self, op: str, fn, *args, **kwargs):
+        """call() for redis.asyncio coroutine functions."""
+        if not self.allow():
+            return None
+        t0 = time.perf_counter()
+        try:
+            result = await fn(*args, **kwargs)
+        except redis.RedisError:
+            abuse_redis_errors_total.labels(op=op).inc()
+            self._strike()
+            return None
+        self._record(op, time.perf_counter() - t0)
+        return result
+
+    def _record(self, op: str, elapsed: float) -> None:
+        abuse_redis_seconds.labels(op=op).observe(elapsed)
+        if elapsed * 1000.0 > BREAKER_SLOW_MS:
+            self._strike()
+        else:
+            with self._lock:
+                self._strikes = 0
+                if self._open:
+                    self._open = False
+                    self._probe_until = 0.0
+                    abuse_breaker_open.set(0)
+
+    def _strike(self) -> None:
+        with self._lock:
+            if self._open:
+                # The half-open probe failed: reopen for another cooldown
+                self._open_until = time.monotonic() + BREAKER_COOLDOWN_SECONDS
+                self._probe_until = 0.0
+                return
+            self._strikes += 1
+            if self._strikes >= BREAKER_FAILURES:
+                self._strikes = 0
+                self._open = True
+                self._open_until = time.monotonic() + BREAKER_COOLDOWN_SECONDS
+                abuse_breaker_open.set(1)
+
+
+breaker = _CircuitBreaker()
 
 
 def _client_ip(request) -> str:
@@ -30,16 +203,168 @@ def _client_ip(request) -> str:
     return request.META.get("REMOTE_ADDR", "unknown")
 
 
+def _may_escalate(request, ip: str) -> bool:
+    # _client_ip() trusts the first X-Forwarded-For entry; escalation does not.
+    return networks.may_escalate(ip, request.META.get("REMOTE_ADDR"), request.META.get("HTTP_X_FORWARDED_FOR"))
+
+
+class _LocalTier:
+    """
+    In-process cache of block verdicts and pending 401 counts per IP.
+
+    - blocked(ip) answers from memory while the cached verdict is fresh and
+      only asks Redis once per LOCAL_TTL_MS per IP. A blocked network
+      (prefix tree, refreshed at most once per LOCAL_TTL_MS) blocks first.
+    - count_401(ip) accumulates locally and flushes to Redis with one INCRBY
+      every FLUSH_EVERY failures (a lease of FLUSH_EVERY counts), as one
+      Lua call that also sets the window TTL and the block.
+    All Redis calls go through the circuit breaker. ablocked()/acount_401()
+    are the same over redis.asyncio for the ASGI path.
+    """
+
+    def __init__(self):
+        self._verdicts = {}  # ip -> (blocked, expires_at)
+        self._pending = {}   # ip -> (unflushed 401 count, first 401 of the batch), capped at LOCAL_MAX_IPS
+        self._lock = threading.Lock()
+        self._networks_checked_at = 0.0
+
+    def blocked(self, ip: str) -> bool:
+        now = time.monotonic()
+        if now >= self._networks_checked_at:
+            self._networks_checked_at = now + LOCAL_TTL_MS / 1000.0
+            self._refresh_networks()
+        if networks.blocked(ip):
+            return True
+        hit = self._verdicts.get(ip)
+        if hit is not None and now < hit[1]:
+            return hit[0]
+        exists = breaker.call("exists", r.exists, f"abuse:block:{ip}")
+        return self._settle(ip, exists, now)
+
+    async def ablocked(self, ip: str) -> bool:
+        now = time.monotonic()
+        if now >= self._networks_checked_at:
+            self._networks_checked_at = now + LOCAL_TTL_MS / 1000.0
+            await self._arefresh_networks()
+        if networks.blocked(ip):
+            return True
+        hit = self._verdicts.get(ip)
+        if hit is not None and now < hit[1]:
+            return hit[0]
+        client, _, _ = _async_redis()
+        exists = await breaker.acall("exists", client.exists, f"abuse:block:{ip}")
+        return self._settle(ip, exists, now)
+
+    def _refresh_networks(self) -> None:
+        version = breaker.call("cidr_version", r.get, networks.version_key)
+        if version is None or version == networks.version:
+            return
+        rows = breaker.call("cidr_load", r.zrangebyscore, networks.key, time.time(), "+inf", withscores=True)
+        if rows is not None:
+            networks.load(rows, version)
+
+    async def _arefresh_networks(self) -> None:
+        client, _, _ = _async_redis()
+        version = await breaker.acall("cidr_version", client.get, networks.version_key)
+        if version is None or version == networks.version:
+            return
+        rows = await breaker.acall(
+            "cidr_load", client.zrangebyscore, networks.key, time.time(), "+inf", withscores=True
+        )
+        if rows is not None:
+            networks.load(rows, version)
+
+    def _settle(self, ip: str, exists, now: float) -> bool:
+        if exists is None:
+            return False  # breaker open or Redis error: fail open, don't cache
+        is_blocked = bool(exists)
+        self._remember(ip, is_blocked, now)
+        return is_blocked
+
+    def count_401(self, ip: str, escalate: bool = False) -> None:
+        pending = self._take_pending(ip)
+        if not pending:
+            return
+        blocked = breaker.call(
+            "count_401",
+            count_401_script,
+            keys=[f"abuse:401:{ip}", f"abuse:block:{ip}", BLOCKED_INDEX],
+            args=[pending, WINDOW_SECONDS, MAX_401, BLOCK_SECONDS, ip],
+        )
+        if blocked:
+            self._remember(ip, True, time.monotonic())
+            escalation = networks.escalation(ip, BLOCK_SECONDS) if escalate else None
+            if escalation is not None and breaker.call(
+                "cidr_escalate", escalate_script, keys=escalation[0], args=escalation[1]
+            ):
+                self._networks_checked_at = 0.0
+
+    async def acount_401(self, ip: str, escalate: bool = False) -> None:
+        pending = self._take_pending(ip)
+        if not pending:
+            return
+        client, script, escalate_script = _async_redis()
+        blocked = await breaker.acall(
+            "count_401",
+            script,
+            keys=[f"abuse:401:{ip}", f"abuse:block:{ip}", BLOCKED_INDEX],
+            args=[pending, WINDOW_SECONDS, MAX_401, BLOCK_SECONDS, ip],
+            client=client,
+        )
+        if blocked:
+            self._remember(ip, True, time.monotonic())
+            escalation = networks.escalation(ip, BLOCK_SECONDS) if escalate else None
+            if escalation is not None and await breaker.acall(
+                "cidr_escalate", escalate_script, keys=escalation[0], args=escalation[1], client=client
+            ):
+                self._networks_checked_at = 0.0
+
+    def _take_pending(self, ip: str) -> int:
+        """Count one 401; returns the batch to flush, or 0 while still batching."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._pending.pop(ip, None)
+            # A batch older than the window would only have counted in an expired one
+            pending = entry[0] + 1 if entry is not None and now - entry[1] < WINDOW_SECONDS else 1
+            if pending < FLUSH_EVERY:
+                if self._pending and len(self._pending) >= LOCAL_MAX_IPS:
+                    # Least recently active first; losing it under-counts by < FLUSH_EVERY
+                    del self._pending[next(iter(self._pending))]
+                self._pending[ip] = (pending, entry[1] if entry is not None and pending > 1 else now)
+                return 0
+            return pending
+
+    def _remember(self, ip: str, is_blocked: bool, now: float) -> None:
+        with self._lock:
+            if len(self._verdicts) >= LOCAL_MAX_IPS:
+                self._verdicts.clear()
+            self._verdicts[ip] = (is_blocked, now + LOCAL_TTL_MS / 1000.0)
+
+
 class AbuseBlockMiddleware:
     """
     - If IP is blocked => return 403 for API routes.
     - If IP causes too many 401s on auth/secure endpoints => block for BLOCK_SECONDS.
+    - Both checks go through _LocalTier, so most requests never reach Redis.
+    - Time spent in the middleware itself (excluding the view) is exported as
+      abuse_middleware_overhead_seconds{phase="pre"|"post"}.
+    - Sync and async capable: under daphne __acall__ runs on the event loop
+      with redis.asyncio instead of being wrapped in a sync_to_async hop.
     """
 
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.local = _LocalTier()
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
         path = request.path or ""
         ip = _client_ip(request)
 
@@ -48,17 +373,41 @@ class AbuseBlockMiddleware:
 
         protect = path.startswith("/api/auth/") or path.startswith("/api/secure/")
         if protect:
-            if r.exists(f"abuse:block:{ip}"):
+            t0 = time.perf_counter()
+            blocked = self.local.blocked(ip)
+            abuse_middleware_overhead_seconds.labels(phase="pre").observe(time.perf_counter() - t0)
+            if blocked:
                 return JsonResponse({"detail": "blocked"}, status=403)
 
         response = self.get_response(request)
 
         if protect and response.status_code == 401:
-            key = f"abuse:401:{ip}"
-            count = r.incr(key)
-            if count == 1:
-                r.expire(key, WINDOW_SECONDS)
-            if count >= MAX_401:
-                r.setex(f"abuse:block:{ip}", BLOCK_SECONDS, "1")
+            t0 = time.perf_counter()
+            self.local.count_401(ip, escalate=_may_escalate(request, ip))
+            abuse_middleware_overhead_seconds.labels(phase="post").observe(time.perf_counter() - t0)
+
+        return response
+
+    async def __acall__(self, request):
+        path = request.path or ""
+        ip = _client_ip(request)
+
+        if ALLOW_LOCAL and ip in ("127.0.0.1", "::1"):
+            return await self.get_response(request)
+
+        protect = path.startswith("/api/auth/") or path.startswith("/api/secure/")
+        if protect:
+            t0 = time.perf_counter()
+            blocked = await self.local.ablocked(ip)
+            abuse_middleware_overhead_seconds.labels(phase="pre").observe(time.perf_counter() - t0)
+            if blocked:
+                return JsonResponse({"detail": "blocked"}, status=403)
+
+        response = await self.get_response(request)
+
+        if protect and response.status_code == 401:
+            t0 = time.perf_counter()
+            await self.local.acount_401(ip, escalate=_may_escalate(request, ip))
+            abuse_middleware_overhead_seconds.labels(phase="post").observe(time.perf_counter() - t0)
 
         return response
@@ -1,7 +1,34 @@
-from prometheus_client import Counter
+from prometheus_client import Counter, Gauge, Histogram
 
 experiment_marker_total = Counter(
     "experiment_marker_total",
     "Manual markers for experiments",
     ["name"],
 )
+
+_FAST_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+abuse_middleware_overhead_seconds = Histogram(
+    "abuse_middleware_overhead_seconds",
+    "Time spent inside AbuseBlockMiddleware, excluding the view",
+    ["phase"],
+    buckets=_FAST_BUCKETS,
+)
+
+abuse_redis_seconds = Histogram(
+    "abuse_redis_seconds",
+    "Latency of AbuseBlockMiddleware Redis calls",
+    ["op"],
+    buckets=_FAST_BUCKETS,
+)
+
+abuse_redis_errors_total = Counter(
+    "abuse_redis_errors_total",
+    "AbuseBlockMiddleware Redis calls that failed (request failed open)",
+    ["op"],
+)
+
+abuse_breaker_open = Gauge(
+    "abuse_breaker_open",
+    "1 while the AbuseBlockMiddleware Redis circuit breaker is open",
+)
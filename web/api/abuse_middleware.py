@@ -6,28 +6,49 @@ Goal for the dissertation experiment:
 - When defenses are ON, abusive traffic should be blocked quickly and consistently.
 
 How it works:
-- When enabled, it rate-limits by (client_ip, path) using Django cache.
-- If cache is backed by Redis, this becomes multi-process safe.
+- When enabled, it rate-limits the routes in the limits table
+  (limits_table.py: prefix -> window, max, cost, key strategy; by default
+  per (client_ip, path)), matched with one radix-tree lookup.
+- Every protected request also feeds a streaming anomaly detector per IP and
+  per bearer token (anomaly.py); a flagged client is put on the temporary
+  denylist (blocklist.py) for EGISLAND_ANOMALY_BLOCK_SECONDS.
+- Protected requests are counted in Space-Saving top-K sketches of
+  (ip, path) and (jwt subject, path), whether or not the defense is on
+  (heavy_hitters.py).
+- Limiter backend is chosen by EGISLAND_DEFENSE_LIMITER (see ratelimit.py):
+  "lease" (default) = in-process token bucket refilled from a Redis GCRA in
+  batches, so most decisions never leave the process;
+  "gcra" = one atomic Redis EVALSHA per request, no window-edge bursts;
+  "fixed" = the original fixed window on the Django cache;
+  "shm" = a GCRA table in shared memory, for single-host deployments.
 
 Enable/disable:
 - Env var: EGISLAND_DEFENSE_ENABLED=1  (default 0)
-- Optional runtime toggle via cache key: "egisland:defense_enabled" (bool)
-  (see defense_views.py for endpoints to set it)
+- Optional runtime toggle held in process memory and updated by broadcast
+  (see defense_state.py; defense_views.py has the endpoints to set it)
 
 Response when blocked:
 - Status code controlled by EGISLAND_DEFENSE_BLOCK_STATUS (default 403)
+- Retry-After header tells the client when the next request would pass
+
+Runs natively in both modes: async under daphne (no thread hop, Redis via
+redis.asyncio), sync under WSGI / runserver.
 """
 
 from __future__ import annotations
 
+import math
 import os
-import time
-from dataclasses import dataclass
-from typing import Optional
+from typing import Optional, Tuple
 
-from django.core.cache import cache
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
 from django.http import JsonResponse
-from django.utils.deprecation import MiddlewareMixin
+
+from . import blocklist, defense_state, limits_table
+from .anomaly import AnomalyDetector, bearer_key
+from .heavy_hitters import get_heavy_hitters
+from .limits_table import LimitRule
+from .ratelimit import Decision, build_limiter
 
 
 def _env_int(name: str, default: int) -> int:
@@ -44,10 +65,8 @@ def _env_bool(name: str, default: bool = False) -> bool:
     return v.strip().lower() in ("1", "true", "yes", "on")
 
 
-@dataclass
-class RateLimit:
-    window_seconds: int = 10
-    max_requests: int = 50
+# ASGI scope flag set by config/edge.py once it has checked a request.
+EDGE_CHECKED = "egisland.edge_checked"
 
 
 def client_ip(request) -> str:
@@ -58,78 +77,171 @@ def client_ip(request) -> str:
     return request.META.get("REMOTE_ADDR", "unknown")
 
 
-class AbuseProtectionMiddleware(MiddlewareMixin):
+def may_escalate(request, ip: str) -> bool:
+    """client_ip() is client-supplied; only a trusted hop may get its network blocked."""
+    return blocklist.may_escalate(ip, request.META.get("REMOTE_ADDR"), request.META.get("HTTP_X_FORWARDED_FOR"))
+
+
+class DefensePolicy:
     """
-    Apply basic rate limiting to the API.
+    Defense configuration and limiter, shared (one per process) by
+    AbuseProtectionMiddleware and the ASGI edge in config/edge.py, so both
+    count against the same local buckets.
     """
 
-    def __init__(self, get_response=None):
-        super().__init__(get_response)
+    def __init__(self):
         self.enabled = _env_bool("EGISLAND_DEFENSE_ENABLED", False)
         self.block_status = _env_int("EGISLAND_DEFENSE_BLOCK_STATUS", 403)
 
-        # You can tune these per endpoint later; start simple and stable.
-        self.default_limit = RateLimit(
-            window_seconds=_env_int("EGISLAND_DEFENSE_WINDOW_SECONDS", 10),
-            max_requests=_env_int("EGISLAND_DEFENSE_MAX_REQUESTS", 50),
-        )
+        # Protected routes and their limits (limits_table.py)
+        limits_table.start()
+
+        self.limiter = build_limiter(os.getenv("EGISLAND_DEFENSE_LIMITER", "lease").strip().lower())
+
+        # Streaming anomaly detection with auto-quarantine (see anomaly.py)
+        self.detector = AnomalyDetector.from_env() if _env_bool("EGISLAND_ANOMALY_ENABLED", True) else None
+        self.quarantine_seconds = _env_int("EGISLAND_ANOMALY_BLOCK_SECONDS", 300)
+
+        # Top-K (ip, path) / (subject, path) counters, see heavy_hitters.py
+        self.heavy_hitters = get_heavy_hitters()
+        defense_state.start()
+        blocklist.start()
+
+    def rule_for(self, path: str) -> Optional[LimitRule]:
+        """The limits table rule protecting this path (None = not protected)."""
+        return limits_table.current().match(path)
+
+    def runtime_enabled(self) -> bool:
+        # runtime override wins if present (in-process, no cache round trip)
+        return defense_state.enabled(self.enabled)
+
+    def hit(self, rule: LimitRule, ip: str, path: str, authorization: Optional[str]) -> Decision:
+        return self.limiter.hit(rule.limiter_key(ip, path, authorization), rule.limit, rule.cost)
+
+    async def ahit(self, rule: LimitRule, ip: str, path: str, authorization: Optional[str]) -> Decision:
+        return await self.limiter.ahit(rule.limiter_key(ip, path, authorization), rule.limit, rule.cost)
+
+    def anomalous(self, ip: str, authorization: Optional[str]) -> bool:
+        """Feed the detector with this request; True if its IP or token is flagged."""
+        detector = self.detector
+        if detector is None:
+            return False
+        flagged = detector.observe(f"ip:{ip}") is not None
+        token = bearer_key(authorization)
+        if token is not None and detector.observe(token) is not None:
+            flagged = True
+        return flagged
+
+    def quarantine(self, ip: str, escalate: bool = False) -> None:
+        # A flagged token is quarantined through the IP presenting it.
+        try:
+            blocklist.block(ip, self.quarantine_seconds, reason="anomaly", escalate=escalate)
+        except Exception:
+            # block() updates this worker's mirror before touching Redis, so
+            # the client stays blocked here even if Redis is down.
+            pass
+
+
+_policy: Optional[DefensePolicy] = None
 
-        # Apply to these path prefixes only (avoid admin/static)
-        self.protected_prefixes = tuple(
-            p.strip() for p in os.getenv(
-                "EGISLAND_DEFENSE_PATH_PREFIXES",
-                "/api/auth/token/,/api/secure/ping,/api/secure/state"
-            ).split(",")
-            if p.strip()
-        )
 
-    def _runtime_enabled(self) -> bool:
-        # runtime override wins if present
-        v = cache.get("egisland:defense_enabled")
-        if v is None:
-            return self.enabled
-        return bool(v)
+def get_policy() -> DefensePolicy:
+    global _policy
+    if _policy is None:
+        _policy = DefensePolicy()
+    return _policy
 
-    def _limit_for_path(self, path: str) -> RateLimit:
-        # Example: stricter on token endpoint
-        if path.startswith("/api/auth/token"):
-            return RateLimit(window_seconds=self.default_limit.window_seconds, max_requests=max(10, self.default_limit.max_requests // 2))
-        return self.default_limit
+
+class AbuseProtectionMiddleware:
+    """
+    Apply basic rate limiting to the API.
+
+    Sync and async capable: under daphne the chain is async and __acall__
+    stays on the event loop (blocklist and local lease checks are in memory,
+    lease refills use redis.asyncio), so Django does not wrap this middleware
+    in a sync_to_async thread hop. Under WSGI __call__ runs the same checks
+    synchronously.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.policy = get_policy()
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.process_request(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        return await self.aprocess_request(request) or await self.get_response(request)
 
     def process_request(self, request):
-        if not self._runtime_enabled():
+        target = self._target(request)
+        if target is None:
+            return None
+        ip, path, rule = target
+        if blocklist.is_blocked(ip):
+            return _blocked_response()
+        policy = self.policy
+        authorization = request.META.get("HTTP_AUTHORIZATION")
+        if policy.anomalous(ip, authorization):
+            policy.quarantine(ip, escalate=may_escalate(request, ip))
+            return _blocked_response()
+        decision = policy.hit(rule, ip, path, authorization)
+        return None if decision.allowed else self._rate_limited(path, decision)
+
+    async def aprocess_request(self, request):
+        target = self._target(request)
+        if target is None:
             return None
+        ip, path, rule = target
+        if blocklist.is_blocked(ip):
+            return _blocked_response()
+        policy = self.policy
+        authorization = request.META.get("HTTP_AUTHORIZATION")
+        if policy.anomalous(ip, authorization):
+            await sync_to_async(policy.quarantine, thread_sensitive=False)(
+                ip, escalate=may_escalate(request, ip)
+            )
+            return _blocked_response()
+        decision = await policy.ahit(rule, ip, path, authorization)
+        return None if decision.allowed else self._rate_limited(path, decision)
 
+    def _target(self, request) -> Optional[Tuple[str, str, LimitRule]]:
+        """(client ip, path, rule) if the defense applies to this request, else None."""
         path = request.path or ""
-        if not any(path.startswith(pref) for pref in self.protected_prefixes):
+        rule = self.policy.rule_for(path)
+        if rule is None:
             return None
 
-        ip = client_ip(request)
-        limit = self._limit_for_path(path)
-
-        now = int(time.time())
-        window = now // max(1, limit.window_seconds)
-        key = f"egisland:rl:{ip}:{path}:{window}"
+        # Already decided (and counted) by the ASGI edge (config/edge.py).
+        if getattr(request, "scope", None) and request.scope.get(EDGE_CHECKED):
+            return None
 
-        # cache.add returns True if key was added (i.e., first request)
-        if cache.add(key, 1, timeout=limit.window_seconds + 2):
+        ip = client_ip(request)
+        self.policy.heavy_hitters.record(ip, path, request.META.get("HTTP_AUTHORIZATION"))
+        if not self.policy.runtime_enabled():
             return None
+        return ip, path, rule
+
+    def _rate_limited(self, path: str, decision: Decision) -> JsonResponse:
+        response = JsonResponse(
+            {
+                "detail": "Blocked by rate limit",
+                "reason": "rate_limit",
+                "path": path,
+            },
+            status=self.policy.block_status,
+        )
+        response["Retry-After"] = str(max(1, math.ceil(decision.retry_after)))
+        return response
 
-        try:
-            count = cache.incr(key)
-        except Exception:
-            # Some cache backends don't support incr; fallback to get+set
-            count = int(cache.get(key, 1)) + 1
-            cache.set(key, count, timeout=limit.window_seconds + 2)
-
-        if count > limit.max_requests:
-            return JsonResponse(
-                {
-                    "detail": "Blocked by rate limit",
-                    "reason": "rate_limit",
-                    "path": path,
-                },
-                status=self.block_status,
-            )
 
-        return None
+def _blocked_response() -> JsonResponse:
+    return JsonResponse({"detail": "blocked", "reason": "denylist"}, status=403)
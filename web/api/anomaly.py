@@ -0,0 +1,195 @@
+"""
+Streaming per-client anomaly detector (roadmap D3, auto-quarantine).
+
+Goal for the dissertation experiment:
+- A client (IP or bearer token) that suddenly sends far more requests than its
+  own recent history is flagged and put on the temporary denylist, without a
+  hand-tuned threshold per endpoint.
+
+How it works:
+- Each observed request updates the client's state in O(1):
+  * 1 s rate: event count decayed with a 1 s time constant (~ req/s now);
+  * 10 s and 60 s baselines: EWMA mean and variance of that 1 s rate, with
+    10 s and 60 s time constants (alpha = 1 - exp(-dt / window)).
+- z = (rate_1s - mean_w) / sqrt(var_w + MIN_STD^2) for both baselines. The
+  client is flagged when the larger z reaches EGISLAND_ANOMALY_Z, its 1 s rate
+  is at least EGISLAND_ANOMALY_MIN_RATE and it has made MIN_EVENTS requests.
+- State is one float64 row per client in a growable 2-D array plus a
+  key -> row dict (about 150 bytes per client including the dict entry).
+- Memory cap: when EGISLAND_ANOMALY_MAX_KEYS rows are in use, one vectorized
+  pass frees every client idle for EVICT_IDLE_SECONDS (all its estimates have
+  decayed below 1%, so nothing is lost). If that is not enough, the tenth
+  with the lowest decayed 60 s mean is freed.
+
+Env:
+- EGISLAND_ANOMALY_ENABLED        1/0 (default 1; only runs while the defense is on)
+- EGISLAND_ANOMALY_Z              z-score threshold (default 6)
+- EGISLAND_ANOMALY_MIN_RATE       minimum 1 s rate in req/s to flag (default 20)
+- EGISLAND_ANOMALY_MIN_EVENTS     requests seen before a client can be flagged (default 30)
+- EGISLAND_ANOMALY_MIN_STD        std floor in req/s (default 1.0)
+- EGISLAND_ANOMALY_MAX_KEYS       tracked clients per process (default 1000000)
+- EGISLAND_ANOMALY_BLOCK_SECONDS  denylist TTL for a flagged client (default 300)
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .metrics_custom import anomaly_flags_total, anomaly_tracked_clients
+
+# Row layout: last seen, 1 s rate, 10 s mean/var, 60 s mean/var, events seen
+T, RATE, M10, V10, M60, V60, N = range(7)
+FIELDS = 7
+
+EVICT_IDLE_SECONDS = 300.0  # 5 x the slowest time constant
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def bearer_key(authorization: Optional[str]) -> Optional[str]:
+    """Detector key for a bearer token: its signature segment identifies it."""
+    if not authorization or not authorization.startswith("Bearer "):
+        return None
+    signature = authorization.rpartition(".")[2]
+    return f"tok:{signature[:32]}" if signature else None
+
+
+class AnomalyDetector:
+    def __init__(
+        self,
+        z_threshold: float = 6.0,
+        min_rate: float = 20.0,
+        min_events: int = 30,
+        min_std: float = 1.0,
+        max_keys: int = 1_000_000,
+        initial_capacity: int = 4096,
+    ):
+        self.z_threshold = z_threshold
+        self.min_rate = min_rate
+        self.min_events = min_events
+        self.min_var = min_std * min_std
+        self.max_keys = max(16, max_keys)
+
+        self._rows = np.zeros((min(initial_capacity, self.max_keys), FIELDS))
+        self._slots: Dict[str, int] = {}
+        self._free: List[int] = list(range(len(self._rows) - 1, -1, -1))
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "AnomalyDetector":
+        return cls(
+            z_threshold=_env_float("EGISLAND_ANOMALY_Z", 6.0),
+            min_rate=_env_float("EGISLAND_ANOMALY_MIN_RATE", 20.0),
+            min_events=_env_int("EGISLAND_ANOMALY_MIN_EVENTS", 30),
+            min_std=_env_float("EGISLAND_ANOMALY_MIN_STD", 1.0),
+            max_keys=_env_int("EGISLAND_ANOMALY_MAX_KEYS", 1_000_000),
+        )
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def observe(self, key: str, now: Optional[float] = None) -> Optional[float]:
+        """
+        Count one request for key. Returns its z-score if this request makes it
+        anomalous, else None. A flagged client starts warming up again, so it
+        is not reported on every following request.
+        """
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = self._allocate(key)
+                self._rows[slot] = (now, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0)
+                return None
+
+            t, rate, m10, v10, m60, v60, n = self._rows[slot].tolist()
+            dt = max(0.0, now - t)
+            rate = rate * math.exp(-dt) + 1.0
+
+            a = 1.0 - math.exp(-dt / 10.0)
+            diff = rate - m10
+            m10 += a * diff
+            v10 = (1.0 - a) * (v10 + a * diff * diff)
+
+            a = 1.0 - math.exp(-dt / 60.0)
+            diff = rate - m60
+            m60 += a * diff
+            v60 = (1.0 - a) * (v60 + a * diff * diff)
+
+            n += 1.0
+            z = None
+            if n >= self.min_events and rate >= self.min_rate:
+                score = max(
+                    (rate - m10) / math.sqrt(v10 + self.min_var),
+                    (rate - m60) / math.sqrt(v60 + self.min_var),
+                )
+                if score >= self.z_threshold:
+                    z = score
+                    n = 0.0
+            self._rows[slot] = (now, rate, m10, v10, m60, v60, n)
+
+        if z is not None:
+            anomaly_flags_total.labels(kind=key.partition(":")[0]).inc()
+        return z
+
+    def rate(self, key: str, now: Optional[float] = None) -> float:
+        """Current 1 s rate estimate for key (0.0 if not tracked)."""
+        slot = self._slots.get(key)
+        if slot is None:
+            return 0.0
+        if now is None:
+            now = time.monotonic()
+        t, rate = self._rows[slot, T], self._rows[slot, RATE]
+        return float(rate * math.exp(-max(0.0, now - t)))
+
+    def _allocate(self, key: str) -> int:
+        if not self._free:
+            if len(self._rows) < self.max_keys:
+                self._grow()
+            else:
+                self._evict(time.monotonic())
+        slot = self._free.pop()
+        self._slots[key] = slot
+        if len(self._slots) % 1024 == 0:
+            anomaly_tracked_clients.set(len(self._slots))
+        return slot
+
+    def _grow(self) -> None:
+        old = len(self._rows)
+        new = min(self.max_keys, old * 2)
+        rows = np.zeros((new, FIELDS))
+        rows[:old] = self._rows
+        self._rows = rows
+        self._free.extend(range(new - 1, old - 1, -1))
+
+    def _evict(self, now: float) -> None:
+        used = np.fromiter(self._slots.values(), dtype=np.int64, count=len(self._slots))
+        idle = now - self._rows[used, T]
+        stale = used[idle >= EVICT_IDLE_SECONDS]
+        k = max(1, len(used) // 10)
+        if len(stale) < k:
+            activity = self._rows[used, M60] * np.exp(-idle / 60.0)
+            stale = used[np.argpartition(activity, k - 1)[:k]]
+        freed = set(stale.tolist())
+        self._slots = {key: s for key, s in self._slots.items() if s not in freed}
+        self._free.extend(freed)
+        anomaly_tracked_clients.set(len(self._slots))
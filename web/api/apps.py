@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.contrib.auth import get_user_model
+        from django.db.models.signals import post_delete, post_save
+
+        from .jwt_cache import user_changed
+
+        # Drop cached JWT users (all workers) when an account changes.
+        user_model = get_user_model()
+        post_save.connect(user_changed, sender=user_model, dispatch_uid="api.jwt_cache.user_saved")
+        post_delete.connect(user_changed, sender=user_model, dispatch_uid="api.jwt_cache.user_deleted")
@@ -0,0 +1,34 @@
+"""
+Authentication backends for the API.
+
+PooledModelBackend is Django's ModelBackend with the password check done in
+the hashing process pool (hash_pool.py). Permission methods are inherited.
+"""
+
+from __future__ import annotations
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from . import hash_pool
+
+UserModel = get_user_model()
+
+
+class PooledModelBackend(ModelBackend):
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if not hash_pool.ENABLED:
+            return super().authenticate(request, username=username, password=password, **kwargs)
+
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            hash_pool.check(password, None)
+            return None
+        if hash_pool.check(password, user.password) and self.user_can_authenticate(user):
+            return user
+        return None
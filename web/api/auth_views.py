@@ -1,15 +1,82 @@
-from rest_framework.permissions import AllowAny
-from rest_framework.throttling import ScopedRateThrottle
+import math
+
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
+from . import cardinality, lockout, refresh_rotation, token_denylist
+from .abuse_middleware import client_ip, get_policy, may_escalate
+from .throttling import GcraScopedRateThrottle
+
 
 class TokenObtainPairThrottledView(TokenObtainPairView):
     permission_classes = [AllowAny]
-    throttle_classes = [ScopedRateThrottle]
+    throttle_classes = [GcraScopedRateThrottle]
     throttle_scope = "auth_token"
 
+    def post(self, request, *args, **kwargs):
+        username = request.data.get("username")
+        if not isinstance(username, str) or not username:
+            return super().post(request, *args, **kwargs)
+        enforce = get_policy().runtime_enabled()
+
+        # Locked usernames stop here: one Redis call, no DB, no hasher (lockout.py)
+        if enforce:
+            wait = lockout.locked_for(username)
+            if wait:
+                return Response(
+                    {"detail": "Account temporarily locked", "reason": "locked"},
+                    status=429,
+                    headers={"Retry-After": str(max(1, math.ceil(wait)))},
+                )
+
+        # Distinct IPs per username / usernames per IP, see cardinality.py
+        ip = client_ip(request)
+        rule = cardinality.check_login(
+            ip, username, request.path, enforce=enforce, escalate=may_escalate(request, ip)
+        )
+        if rule == "credential_stuffing":
+            return Response({"detail": "blocked", "reason": rule}, status=403)
+        if rule == "distributed_login":
+            return Response(
+                {"detail": "Too many sources for this account", "reason": rule},
+                status=429,
+                headers={"Retry-After": str(cardinality.WINDOW_SECONDS)},
+            )
+
+        try:
+            response = super().post(request, *args, **kwargs)
+        except AuthenticationFailed:
+            if enforce:
+                lockout.record_failure(username)
+            raise
+        if enforce and response.status_code == 200:
+            lockout.record_success(username)
+        return response
+
 
 class TokenRefreshThrottledView(TokenRefreshView):
     permission_classes = [AllowAny]
-    throttle_classes = [ScopedRateThrottle]
+    throttle_classes = [GcraScopedRateThrottle]
     throttle_scope = "auth_token"
+
+
+class LogoutView(APIView):
+    """Revoke the access token used for this request and its login's refresh tokens."""
+
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [GcraScopedRateThrottle]
+    throttle_scope = "auth_token"
+
+    def post(self, request, *args, **kwargs):
+        token = request.auth
+        jti = token.get(api_settings.JTI_CLAIM)
+        if jti is not None:
+            token_denylist.revoke(jti, float(token["exp"]))
+        family = refresh_rotation.family_of(token)
+        if family is not None:
+            refresh_rotation.revoke_family(family)
+        return Response({"detail": "logged out"})
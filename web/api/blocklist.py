@@ -0,0 +1,161 @@
+"""
+Temporary IP denylist shared by all workers.
+
+Storage (Redis):
+- "egisland:block:{ip}"  value = reason, TTL = block duration (source of truth)
+- "egisland:blocked"     sorted set ip -> expires_at (epoch), so the active
+                         list can be read without SCAN (nginx sync, admin)
+- "egisland:cidr:*"      blocked networks (cidr_blocklist.py): once
+                         EGISLAND_CIDR_ESCALATE_HOSTS hosts of one /24 (IPv6
+                         /64) are blocked, the whole network is. Only blocks
+                         made with escalate=True count; callers pass
+                         may_escalate(), true only for an address from a
+                         trusted hop (EGISLAND_TRUSTED_PROXIES)
+
+Each worker mirrors the active entries in a dict (ip -> expires_at):
+- loaded from the sorted set whenever the broadcast listener (re)connects;
+- updated by "block"/"unblock" broadcasts from whichever worker changed it.
+The blocked networks are mirrored in a prefix tree, rebuilt from Redis on
+(re)connect and on the "cidr" broadcast sent by the worker that escalated.
+
+is_blocked() is therefore a dict lookup plus, while any network is blocked,
+a longest-prefix match, with no Redis round trip on the request path.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Dict, Optional
+
+from . import broadcast
+from .cidr_blocklist import ESCALATE_LUA, CidrBlocklist
+from .redis_client import get_redis
+
+BLOCK_KEY = "egisland:block:{ip}"
+INDEX_KEY = "egisland:blocked"
+
+# Expired entries are dropped lazily on lookup, and in bulk once the mirror
+# grows past this size.
+PRUNE_AT = 10000
+
+_blocked: Dict[str, float] = {}
+_networks = CidrBlocklist.from_env("egisland", "EGISLAND_", block_seconds=600)
+_escalate = None
+_started = False
+
+
+def start() -> None:
+    global _started
+    if _started:
+        return
+    _started = True
+    broadcast.subscribe("block", _on_block)
+    broadcast.subscribe("unblock", _on_unblock)
+    broadcast.subscribe("cidr", lambda message: _reload_networks())
+    broadcast.on_connect(_reload)
+
+
+def is_blocked(ip: str) -> bool:
+    expires_at = _blocked.get(ip)
+    if expires_at is not None:
+        if time.time() < expires_at:
+            return True
+        _blocked.pop(ip, None)
+    return _networks.blocked(ip)
+
+
+def _remember(ip: str, expires_at: float) -> None:
+    if len(_blocked) >= PRUNE_AT:
+        now = time.time()
+        for k in [k for k, exp in _blocked.items() if exp <= now]:
+            _blocked.pop(k, None)
+    _blocked[ip] = expires_at
+
+
+def may_escalate(ip: str, remote_addr, forwarded_for) -> bool:
+    """True if `ip` is the request's trusted hop, not a client-supplied X-Forwarded-For value."""
+    return _networks.may_escalate(ip, remote_addr, forwarded_for)
+
+
+def block(ip: str, seconds: int, reason: str = "manual", escalate: bool = False) -> None:
+    expires_at = time.time() + seconds
+    _remember(ip, expires_at)
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.set(BLOCK_KEY.format(ip=ip), reason, ex=seconds)
+    pipe.zadd(INDEX_KEY, {ip: expires_at})
+    pipe.zremrangebyscore(INDEX_KEY, "-inf", time.time())
+    pipe.execute()
+    broadcast.publish("block", {"ip": ip, "expires_at": expires_at, "reason": reason})
+    if escalate:
+        _escalate_network(ip, seconds)
+
+
+def _escalate_network(ip: str, seconds: int) -> None:
+    global _escalate
+    escalation = _networks.escalation(ip, seconds)
+    if escalation is None:
+        return
+    if _escalate is None:
+        _escalate = get_redis().register_script(ESCALATE_LUA)
+    keys, args = escalation
+    if _escalate(keys=keys, args=args):
+        _reload_networks()
+        broadcast.publish("cidr", {"network": args[3]})
+
+
+def unblock(ip: str) -> Optional[str]:
+    """Lift a host block; returns the blocked network still covering ip, if any."""
+    _blocked.pop(ip, None)
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.delete(BLOCK_KEY.format(ip=ip))
+    pipe.zrem(INDEX_KEY, ip)
+    host = _networks.unblock_host(ip)
+    if host is not None:
+        pipe.zrem(*host)  # no longer counts towards escalating its network
+    pipe.execute()
+    broadcast.publish("unblock", {"ip": ip})
+    covering = _networks.match(ip)
+    return covering[0] if covering else None
+
+
+def unblock_network(network: str) -> str:
+    """Lift a network block on every worker; raises ValueError for a malformed network."""
+    network = _networks.unblock_network(network)
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.zrem(_networks.key, network)
+    pipe.incr(_networks.version_key)
+    pipe.execute()
+    _reload_networks()
+    broadcast.publish("cidr", {"network": network})
+    return network
+
+
+def active() -> Dict[str, float]:
+    """Active entries straight from Redis (ip -> expires_at)."""
+    now = time.time()
+    rows = get_redis().zrangebyscore(INDEX_KEY, now, "+inf", withscores=True)
+    return {ip.decode(): score for ip, score in rows}
+
+
+def active_networks() -> Dict[str, float]:
+    """Blocked networks straight from Redis (network -> expires_at)."""
+    rows = get_redis().zrangebyscore(_networks.key, time.time(), "+inf", withscores=True)
+    return {network.decode(): score for network, score in rows}
+
+
+def _reload() -> None:
+    global _blocked
+    _blocked = active()
+    _reload_networks()
+
+
+def _reload_networks() -> None:
+    _networks.load(active_networks().items())
+
+
+def _on_block(message: dict) -> None:
+    _remember(message["ip"], float(message["expires_at"]))
+
+
+def _on_unblock(message: dict) -> None:
+    _blocked.pop(message["ip"], None)
@@ -0,0 +1,103 @@
+"""
+Cross-worker broadcast over Redis pub/sub.
+
+Every worker process runs one daemon listener thread on the channel
+"egisland:events". Messages are JSON objects with a "kind"; handlers are
+registered per kind with subscribe(kind, fn) and are called on the listener
+thread with the decoded message.
+
+publish() stamps "sent_at" (epoch seconds) so receivers can measure delivery
+delay. on_connect hooks run after every (re)subscribe, so state that may have
+changed while the connection was down can be re-read.
+
+The listener uses its own connection without a socket timeout (pub/sub reads
+block by design); reconnects back off up to 5 s.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import socket
+import threading
+import time
+from typing import Callable, Dict, List
+
+import redis
+from django.conf import settings
+
+from .redis_client import get_redis
+
+CHANNEL = "egisland:events"
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+_handlers: Dict[str, List[Callable[[dict], None]]] = {}
+_on_connect: List[Callable[[], None]] = []
+_thread = None
+_lock = threading.Lock()
+
+
+def publish(kind: str, payload: dict) -> int:
+    """Broadcast to every worker. Returns the number of listeners reached."""
+    message = {"kind": kind, "sent_at": time.time(), "from": WORKER_ID, **payload}
+    return int(get_redis().publish(CHANNEL, json.dumps(message)))
+
+
+def subscribe(kind: str, handler: Callable[[dict], None]) -> None:
+    _handlers.setdefault(kind, []).append(handler)
+    start()
+
+
+def on_connect(hook: Callable[[], None]) -> None:
+    _on_connect.append(hook)
+    start()
+
+
+def start() -> None:
+    global _thread
+    if _thread is not None:
+        return
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_listen, name="egisland-broadcast", daemon=True)
+            _thread.start()
+
+
+def _dispatch(raw) -> None:
+    try:
+        message = json.loads(raw)
+    except ValueError:
+        return
+    for handler in _handlers.get(message.get("kind"), ()):
+        try:
+            handler(message)
+        except Exception:
+            # One bad handler must not kill the listener for everyone else.
+            pass
+
+
+def _listen() -> None:
+    backoff = 0.1
+    while True:
+        try:
+            client = redis.Redis.from_url(
+                settings.EGISLAND_REDIS_URL,
+                socket_connect_timeout=1.0,
+                health_check_interval=30,
+            )
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(CHANNEL)
+            for hook in list(_on_connect):
+                try:
+                    hook()
+                except Exception:
+                    pass
+            backoff = 0.1
+            while True:
+                msg = pubsub.get_message(timeout=1.0)
+                if msg is not None and msg.get("type") == "message":
+                    _dispatch(msg["data"])
+        except Exception:
+            time.sleep(backoff)
+            backoff = min(5.0, backoff * 2)
@@ -0,0 +1,181 @@
+"""
+Tiered cache backend: Redis (L2, shared by every worker) with a small,
+bounded in-process L1 for read-mostly keys.
+
+Why: without CACHES, Django falls back to a per-process LocMemCache, so the
+rate limiter, DRF throttles and the defense toggle were all per worker.
+
+How it works:
+- All keys live in Redis (django.core.cache.backends.redis.RedisCache, pooled
+  connections via the normal redis-py ConnectionPool options).
+- Keys starting with one of L1_PREFIXES are also kept in an LRU in process
+  memory for L1_TTL seconds. Only use this for values that may be slightly
+  stale (toggles, config), never for counters.
+- KEY_FAMILY_TTLS maps raw key prefixes to a TTL. The family TTL is used when
+  the caller passes no timeout, so limiter and throttle keys never fall back
+  to the 300 s default, and is a floor under an explicit one. It is never a
+  cap: a limiter window longer than its family TTL must not reset early.
+- FALLBACK decides what happens when Redis is unreachable:
+    "local" (default) serve from an in-process LocMemCache for
+            FALLBACK_RETRY_SECONDS, then probe Redis again;
+    "raise" propagate the redis error to the caller.
+- Requests, hits/misses and latency are exported to Prometheus
+  (egisland_cache_requests_total, egisland_cache_latency_seconds).
+
+Only get/set/add/incr/delete/has_key go through the tiers and the fallback;
+bulk operations use RedisCache directly.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+
+import redis
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+
+from .metrics_custom import cache_latency_seconds, cache_requests_total
+
+_MISSING = object()
+
+
+class TieredRedisCache(RedisCache):
+    def __init__(self, server, params):
+        options = dict(params.get("OPTIONS", {}))
+        self.l1_max_entries = int(options.pop("L1_MAX_ENTRIES", 1024))
+        self.l1_ttl = float(options.pop("L1_TTL", 1.0))
+        self.l1_prefixes = tuple(options.pop("L1_PREFIXES", ()))
+        # Longest prefix first so "egisland:rl:x" beats "egisland:"
+        self.family_ttls = sorted(
+            options.pop("KEY_FAMILY_TTLS", {}).items(), key=lambda kv: -len(kv[0])
+        )
+        self.fallback = options.pop("FALLBACK", "local")
+        self.retry_seconds = float(options.pop("FALLBACK_RETRY_SECONDS", 5))
+        super().__init__(server, {**params, "OPTIONS": options})
+
+        self._l1 = OrderedDict()  # key -> (value, expires_at)
+        self._l1_lock = threading.Lock()
+        self._down_until = 0.0
+        self._local = LocMemCache(
+            "egisland-cache-fallback",
+            {"TIMEOUT": params.get("TIMEOUT", 300), "OPTIONS": {"MAX_ENTRIES": 10000}},
+        )
+
+    # --- helpers
+
+    def _timeout_for(self, key, timeout):
+        for prefix, ttl in self.family_ttls:
+            if key.startswith(prefix):
+                if timeout is DEFAULT_TIMEOUT:
+                    return ttl
+                if ttl is None:
+                    return timeout
+                return ttl if timeout is None else max(timeout, ttl)
+        return timeout
+
+    def _l1_eligible(self, key) -> bool:
+        return bool(self.l1_prefixes) and key.startswith(self.l1_prefixes)
+
+    def _l1_get(self, key):
+        with self._l1_lock:
+            hit = self._l1.get(key)
+            if hit is None:
+                return _MISSING
+            if time.monotonic() >= hit[1]:
+                del self._l1[key]
+                return _MISSING
+            self._l1.move_to_end(key)
+            return hit[0]
+
+    def _l1_put(self, key, value) -> None:
+        with self._l1_lock:
+            self._l1[key] = (value, time.monotonic() + self.l1_ttl)
+            self._l1.move_to_end(key)
+            while len(self._l1) > self.l1_max_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_drop(self, key) -> None:
+        with self._l1_lock:
+            self._l1.pop(key, None)
+
+    def _call(self, op, remote, local):
+        if time.monotonic() < self._down_until:
+            cache_requests_total.labels(op=op, result="fallback").inc()
+            return local()
+        t0 = time.perf_counter()
+        try:
+            return remote()
+        except (redis.ConnectionError, redis.TimeoutError):
+            cache_requests_total.labels(op=op, result="error").inc()
+            if self.fallback != "local":
+                raise
+            self._down_until = time.monotonic() + self.retry_seconds
+            return local()
+        finally:
+            cache_latency_seconds.labels(op=op).observe(time.perf_counter() - t0)
+
+    # --- cache API
+
+    def get(self, key, default=None, version=None):
+        l1 = self._l1_eligible(key)
+        if l1:
+            value = self._l1_get(key)
+            if value is not _MISSING:
+                cache_requests_total.labels(op="get", result="l1_hit").inc()
+                return value
+
+        value = self._call(
+            "get",
+            lambda: super(TieredRedisCache, self).get(key, _MISSING, version),
+            lambda: self._local.get(key, _MISSING, version),
+        )
+        if value is _MISSING:
+            cache_requests_total.labels(op="get", result="miss").inc()
+            return default
+        cache_requests_total.labels(op="get", result="hit").inc()
+        if l1:
+            self._l1_put(key, value)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout_for(key, timeout)
+        if self._l1_eligible(key):
+            self._l1_put(key, value)
+        self._call(
+            "set",
+            lambda: super(TieredRedisCache, self).set(key, value, timeout, version),
+            lambda: self._local.set(key, value, timeout, version),
+        )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout_for(key, timeout)
+        return self._call(
+            "add",
+            lambda: super(TieredRedisCache, self).add(key, value, timeout, version),
+            lambda: self._local.add(key, value, timeout, version),
+        )
+
+    def incr(self, key, delta=1, version=None):
+        return self._call(
+            "incr",
+            lambda: super(TieredRedisCache, self).incr(key, delta, version),
+            lambda: self._local.incr(key, delta, version),
+        )
+
+    def delete(self, key, version=None):
+        self._l1_drop(key)
+        return self._call(
+            "delete",
+            lambda: super(TieredRedisCache, self).delete(key, version),
+            lambda: self._local.delete(key, version),
+        )
+
+    def has_key(self, key, version=None):
+        return self._call(
+            "has_key",
+            lambda: super(TieredRedisCache, self).has_key(key, version),
+            lambda: self._local.has_key(key, version),
+        )
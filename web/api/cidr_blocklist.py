@@ -0,0 +1,296 @@
+"""
+Prefix (CIDR) blocking with automatic escalation from hosts to networks.
+
+Goal for the dissertation experiment:
+- Per-IP blocks are cheap to evade: an attacker rotating through addresses
+  of one /24 (or one IPv6 /64, usually a single customer) gets a fresh
+  budget with every address. Once ESCALATE_HOSTS hosts of the same network
+  have been blocked, the whole network is blocked.
+
+How it works:
+- PrefixTree: a path-compressed binary (patricia) trie over the address
+  bits, one per address family. match() walks from the root and keeps the
+  longest live prefix it passes, so a lookup takes at most prefix-length
+  steps and usually a handful, however many networks are blocked.
+- Redis holds the shared state (a namespace per user, e.g. "egisland" or
+  "abuse"):
+  * "{ns}:cidr:blocked"         sorted set network -> expires_at (epoch);
+                                the serialized tree
+  * "{ns}:cidr:version"         INCRed on every change, so workers can
+                                poll one GET instead of the whole set
+  * "{ns}:cidr:hosts:{network}" sorted set of blocked hosts in the network
+                                -> expires_at, for escalation
+- ESCALATE_LUA records a host block and escalates in one round trip,
+  with Redis TIME for the expiry, so every worker agrees on it.
+- Every worker rebuilds its tree from the sorted set when the version
+  changes and swaps it in with one assignment. Expired networks fall out at
+  the next rebuild, and match() ignores them until then.
+- Only addresses seen from a trusted hop escalate (may_escalate): the peer
+  address itself, or the hop a configured trusted proxy reported in
+  X-Forwarded-For. A leading X-Forwarded-For entry is client-supplied, so
+  it can still get that one address blocked but never its network. With no
+  {PREFIX}TRUSTED_PROXIES, nothing behind a proxy escalates.
+- unblock_network()/unblock_host() return the Redis commands that lift a
+  network block or forget a host.
+
+This module does no I/O itself: callers run the scripts and reads on their
+own (sync, async or circuit-broken) Redis clients. backend/web/api has a
+copy so the backend stays self-contained; keep the two identical.
+
+Env (read by from_env with the caller's prefix, e.g. EGISLAND_ or ABUSE_):
+- {PREFIX}CIDR_V4_PREFIX       IPv4 network length to escalate to (default 24)
+- {PREFIX}CIDR_V6_PREFIX       IPv6 network length to escalate to (default 64)
+- {PREFIX}CIDR_ESCALATE_HOSTS  blocked hosts in a network that block it; 0 = off (default 5)
+- {PREFIX}CIDR_BLOCK_SECONDS   network block duration (default: the caller's host block)
+- {PREFIX}TRUSTED_PROXIES      comma-separated proxy networks whose X-Forwarded-For
+                               hop is trusted, e.g. 172.16.0.0/12 (default none)
+"""
+
+from __future__ import annotations
+
+import ipaddress
+import os
+import socket
+import time
+from typing import Iterable, List, Optional, Tuple
+
+WIDTH = {4: 32, 6: 128}
+NETWORK = {4: ipaddress.IPv4Network, 6: ipaddress.IPv6Network}
+
+# KEYS[1] = {ns}:cidr:hosts:{network}, KEYS[2] = {ns}:cidr:blocked, KEYS[3] = {ns}:cidr:version
+# ARGV = ip, host_seconds, escalate_hosts, network, block_seconds
+# Returns 1 if the network is (now) blocked, else 0.
+ESCALATE_LUA = """
+local now = tonumber(redis.call('TIME')[1])
+local host_seconds = tonumber(ARGV[2])
+redis.call('ZADD', KEYS[1], now + host_seconds, ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+local last = redis.call('ZRANGE', KEYS[1], -1, -1, 'WITHSCORES')
+redis.call('EXPIREAT', KEYS[1], math.ceil(tonumber(last[2])))
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[3]) then
+  return 0
+end
+local expires_at = now + tonumber(ARGV[5])
+local current = tonumber(redis.call('ZSCORE', KEYS[2], ARGV[4]) or '0')
+if current < expires_at then
+  redis.call('ZADD', KEYS[2], expires_at, ARGV[4])
+  redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+  redis.call('INCR', KEYS[3])
+end
+return 1
+"""
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def _parse(address) -> Tuple[int, int]:
+    """(version, address as int); inet_pton is several times faster than ipaddress."""
+    if not isinstance(address, str):
+        address = ipaddress.ip_address(address)
+        return address.version, int(address)
+    try:
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, address), "big")
+    except OSError:
+        pass
+    try:
+        return 6, int.from_bytes(socket.inet_pton(socket.AF_INET6, address), "big")
+    except OSError:
+        raise ValueError(f"not an IP address: {address!r}") from None
+
+
+class _Node:
+    __slots__ = ("bits", "length", "expires_at", "children")
+
+    def __init__(self, bits: int, length: int, expires_at: Optional[float]):
+        self.bits = bits  # network address, host bits zero
+        self.length = length
+        self.expires_at = expires_at  # None = branching node only
+        self.children: List[Optional[_Node]] = [None, None]
+
+
+class PrefixTree:
+    """Patricia trie of networks -> expires_at; match() is a longest-prefix lookup."""
+
+    def __init__(self):
+        self._roots = {4: None, 6: None}
+        self.size = 0
+
+    def insert(self, network, expires_at: float) -> None:
+        network = ipaddress.ip_network(network, strict=False)
+        width = WIDTH[network.version]
+        self._roots[network.version] = self._insert(
+            self._roots[network.version], int(network.network_address), network.prefixlen, expires_at, width
+        )
+        self.size += 1
+
+    def _insert(self, node: Optional[_Node], bits: int, length: int, expires_at: float, width: int) -> _Node:
+        if node is None:
+            return _Node(bits, length, expires_at)
+        common = min(node.length, length)
+        diff = (node.bits ^ bits) >> (width - common) if common else 0
+        if diff:
+            common -= diff.bit_length()
+        if common == node.length:
+            if length == node.length:
+                node.expires_at = max(expires_at, node.expires_at or 0.0)
+                return node
+            side = (bits >> (width - 1 - node.length)) & 1
+            node.children[side] = self._insert(node.children[side], bits, length, expires_at, width)
+            return node
+        if common == length:
+            # The new network contains this node
+            parent = _Node(bits, length, expires_at)
+            parent.children[(node.bits >> (width - 1 - length)) & 1] = node
+            return parent
+        # Siblings: branch at the first differing bit
+        mask = ((1 << common) - 1) << (width - common)
+        branch = _Node(bits & mask, common, None)
+        branch.children[(bits >> (width - 1 - common)) & 1] = _Node(bits, length, expires_at)
+        branch.children[(node.bits >> (width - 1 - common)) & 1] = node
+        return branch
+
+    def match(self, address, now: Optional[float] = None) -> Optional[Tuple[str, float]]:
+        """(network, expires_at) of the longest live prefix containing address, or None."""
+        version, bits = _parse(address)
+        best = self._lookup(version, bits, time.time() if now is None else now)
+        if best is None:
+            return None
+        return str(NETWORK[version]((best.bits, best.length))), best.expires_at
+
+    def contains(self, address, now: Optional[float] = None) -> bool:
+        """True if a live prefix contains address (match() without building the result)."""
+        version, bits = _parse(address)
+        return self._lookup(version, bits, time.time() if now is None else now) is not None
+
+    def _lookup(self, version: int, bits: int, now: float) -> Optional[_Node]:
+        node = self._roots[version]
+        width = WIDTH[version]
+        best = None
+        while node is not None:
+            if (bits ^ node.bits) >> (width - node.length):
+                break
+            if node.expires_at is not None and node.expires_at > now:
+                best = node
+            if node.length == width:
+                break
+            node = node.children[(bits >> (width - 1 - node.length)) & 1]
+        return best
+
+
+class CidrBlocklist:
+    """One worker's view of the blocked networks in Redis namespace `namespace`."""
+
+    def __init__(
+        self,
+        namespace: str,
+        v4_prefix: int = 24,
+        v6_prefix: int = 64,
+        escalate_hosts: int = 5,
+        block_seconds: int = 600,
+        trusted_proxies: Iterable[str] = (),
+    ):
+        self.key = f"{namespace}:cidr:blocked"
+        self.version_key = f"{namespace}:cidr:version"
+        self.hosts_key = f"{namespace}:cidr:hosts:{{network}}"
+        self.prefixes = {4: v4_prefix, 6: v6_prefix}
+        self.escalate_hosts = escalate_hosts
+        self.block_seconds = block_seconds
+        self.version = None
+        self._tree = PrefixTree()
+        self._proxies = PrefixTree()
+        for network in trusted_proxies:
+            self._proxies.insert(network, float("inf"))
+
+    @classmethod
+    def from_env(cls, namespace: str, env_prefix: str, block_seconds: int) -> "CidrBlocklist":
+        return cls(
+            namespace,
+            v4_prefix=_env_int(f"{env_prefix}CIDR_V4_PREFIX", 24),
+            v6_prefix=_env_int(f"{env_prefix}CIDR_V6_PREFIX", 64),
+            escalate_hosts=_env_int(f"{env_prefix}CIDR_ESCALATE_HOSTS", 5),
+            block_seconds=_env_int(f"{env_prefix}CIDR_BLOCK_SECONDS", block_seconds),
+            trusted_proxies=[
+                p.strip() for p in os.getenv(f"{env_prefix}TRUSTED_PROXIES", "").split(",") if p.strip()
+            ],
+        )
+
+    def network_of(self, ip: str) -> Optional[str]:
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+        return str(ipaddress.ip_network((address, self.prefixes[address.version]), strict=False))
+
+    def trusted_hop(self, remote_addr: Optional[str], forwarded_for: Optional[str]) -> Optional[str]:
+        """The client address as far as trusted proxies vouch for it (rightmost untrusted hop)."""
+        hops = [h.strip() for h in forwarded_for.split(",") if h.strip()] if forwarded_for else []
+        hop = remote_addr
+        while hops and self._is_proxy(hop):
+            hop = hops.pop()
+        return hop
+
+    def may_escalate(self, ip: str, remote_addr: Optional[str], forwarded_for: Optional[str]) -> bool:
+        """True if `ip` is the trusted hop of the request, so blocking it may block its network."""
+        return ip == self.trusted_hop(remote_addr, forwarded_for)
+
+    def _is_proxy(self, hop: Optional[str]) -> bool:
+        if hop is None or not self._proxies.size:
+            return False
+        try:
+            return self._proxies.contains(hop)
+        except ValueError:
+            return False
+
+    def unblock_host(self, ip: str) -> Optional[Tuple[str, str]]:
+        """(hosts key, member) to ZREM so a lifted host block stops counting towards escalation."""
+        network = self.network_of(ip)
+        return None if network is None else (self.hosts_key.format(network=network), ip)
+
+    def unblock_network(self, network: str) -> str:
+        """Normalized network to ZREM from self.key (then INCR self.version_key); raises ValueError."""
+        return str(ipaddress.ip_network(network, strict=False))
+
+    def escalation(self, ip: str, host_seconds: int) -> Optional[Tuple[list, list]]:
+        """(keys, args) for ESCALATE_LUA after blocking `ip`, or None if escalation is off."""
+        network = self.network_of(ip)
+        if network is None or self.escalate_hosts <= 0:
+            return None
+        return (
+            [self.hosts_key.format(network=network), self.key, self.version_key],
+            [ip, int(host_seconds), self.escalate_hosts, network, self.block_seconds],
+        )
+
+    def load(self, rows: Iterable[Tuple[object, float]], version=None) -> int:
+        """Rebuild from ZRANGEBYSCORE ... WITHSCORES rows (network, expires_at)."""
+        tree = PrefixTree()
+        for network, expires_at in rows:
+            try:
+                tree.insert(network.decode() if isinstance(network, bytes) else network, float(expires_at))
+            except ValueError:
+                continue
+        self._tree = tree
+        self.version = version
+        return tree.size
+
+    def blocked(self, ip: str) -> bool:
+        tree = self._tree
+        if not tree.size:
+            return False
+        try:
+            return tree.contains(ip)
+        except ValueError:
+            return False
+
+    def match(self, ip: str) -> Optional[Tuple[str, float]]:
+        try:
+            return self._tree.match(ip)
+        except ValueError:
+            return None
+
+    def __len__(self) -> int:
+        return self._tree.size
@@ -0,0 +1,94 @@
+"""
+In-process defense toggle, kept in sync across workers by broadcast.
+
+Before: AbuseProtectionMiddleware read "egisland:defense_enabled" from the
+cache on every request. Now each worker holds the value in memory:
+
+- On (re)connect of the broadcast listener the value is re-read once from the
+  cache, which stays the durable copy for workers that start later.
+- defense_on/defense_off call set_enabled(), which writes the cache, takes a
+  sequence number and broadcasts a "defense_toggle" message.
+- Every worker applies the message, observes the publish-to-apply delay in
+  egisland_defense_toggle_effect_seconds and acks it in the Redis hash
+  "egisland:defense:ack:{seq}" (worker id -> delay in ms).
+  status() returns those acks so an experiment can report the time-to-effect
+  across all workers (the max ack).
+
+Delays use wall-clock time, so across hosts they include clock skew.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Optional
+
+from django.core.cache import cache
+
+from . import broadcast
+from .metrics_custom import defense_toggle_effect_seconds
+from .redis_client import get_redis
+
+TOGGLE_KEY = "egisland:defense_enabled"
+SEQ_KEY = "egisland:defense:seq"
+ACK_KEY = "egisland:defense:ack:{seq}"
+ACK_TTL_SECONDS = 3600
+
+_enabled: Optional[bool] = None  # None = no runtime override, use env default
+_last_seq = 0
+_started = False
+
+
+def enabled(default: bool) -> bool:
+    v = _enabled
+    return default if v is None else v
+
+
+def start() -> None:
+    global _started
+    if _started:
+        return
+    _started = True
+    broadcast.subscribe("defense_toggle", _on_toggle)
+    broadcast.on_connect(_reload)
+
+
+def _reload() -> None:
+    global _enabled
+    v = cache.get(TOGGLE_KEY)
+    _enabled = None if v is None else bool(v)
+
+
+def _on_toggle(message: dict) -> None:
+    global _enabled, _last_seq
+    _enabled = bool(message["enabled"])
+    _last_seq = int(message.get("seq", 0))
+    delay = max(0.0, time.time() - float(message["sent_at"]))
+    defense_toggle_effect_seconds.observe(delay)
+
+    key = ACK_KEY.format(seq=_last_seq)
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.hset(key, broadcast.WORKER_ID, round(delay * 1000.0, 3))
+    pipe.expire(key, ACK_TTL_SECONDS)
+    pipe.execute()
+
+
+def set_enabled(value: bool) -> dict:
+    global _enabled
+    _enabled = value  # this worker flips immediately; the broadcast covers the rest
+    cache.set(TOGGLE_KEY, value, timeout=None)
+    seq = int(get_redis().incr(SEQ_KEY))
+    listeners = broadcast.publish("defense_toggle", {"enabled": value, "seq": seq})
+    return {"defense_enabled": value, "seq": seq, "workers_notified": listeners}
+
+
+def status(seq: Optional[int] = None) -> dict:
+    r = get_redis()
+    if seq is None:
+        seq = int(r.get(SEQ_KEY) or 0)
+    acks = {k.decode(): float(v) for k, v in r.hgetall(ACK_KEY.format(seq=seq)).items()}
+    return {
+        "defense_enabled": _enabled,
+        "seq": seq,
+        "acks_ms": acks,
+        "time_to_effect_ms": max(acks.values()) if acks else None,
+    }
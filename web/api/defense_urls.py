@@ -4,4 +4,8 @@ from . import defense_views
 urlpatterns = [
     path("defense/on", defense_views.defense_on, name="defense_on"),
     path("defense/off", defense_views.defense_off, name="defense_off"),
+    path("defense/status", defense_views.defense_status, name="defense_status"),
+    path("defense/heavy-hitters", defense_views.heavy_hitters, name="defense_heavy_hitters"),
+    path("defense/limits", defense_views.limits, name="defense_limits"),
+    path("defense/blocked", defense_views.blocked, name="defense_blocked"),
 ]
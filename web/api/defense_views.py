@@ -6,16 +6,38 @@ Add to urls.py under something like:
   path("api/admin/", include("api.defense_urls"))
 
 Then:
-  POST /api/admin/defense/on   with header X-DEFENSE-KEY: <key>
-  POST /api/admin/defense/off  with header X-DEFENSE-KEY: <key>
+  POST /api/admin/defense/on      with header X-DEFENSE-KEY: <key>
+  POST /api/admin/defense/off     with header X-DEFENSE-KEY: <key>
+  GET  /api/admin/defense/status  with header X-DEFENSE-KEY: <key>
+       (optional ?seq=N; per-worker time-to-effect of that toggle)
+  GET  /api/admin/defense/heavy-hitters  with header X-DEFENSE-KEY: <key>
+       (optional ?k=N; top clients of this worker, see heavy_hitters.py)
+  GET  /api/admin/defense/limits  with header X-DEFENSE-KEY: <key>
+  POST /api/admin/defense/limits  with header X-DEFENSE-KEY: <key>
+       body {"rules": [{"prefix", "window_seconds", "max_requests",
+       "cost", "key"}, ...]} replaces the limits table on every worker;
+       {"rules": null} goes back to the env defaults (limits_table.py)
+  GET  /api/admin/defense/blocked  with header X-DEFENSE-KEY: <key>
+       (active host and network blocks, see blocklist.py)
+  POST /api/admin/defense/blocked  with header X-DEFENSE-KEY: <key>
+       body {"unblock": "<ip>"} lifts a host block, {"unblock": "<cidr>"}
+       a network block
+
+Toggles, limits and blocks are broadcast to every worker, see
+defense_state.py, limits_table.py and blocklist.py.
 """
 
 from __future__ import annotations
 
+import ipaddress
+import json
 import os
-from django.core.cache import cache
 from django.http import JsonResponse
-from django.views.decorators.http import require_POST
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_http_methods, require_POST
+
+from . import blocklist, defense_state, limits_table
+from .heavy_hitters import get_heavy_hitters
 
 
 def _auth_ok(request) -> bool:
@@ -31,13 +53,62 @@ def _auth_ok(request) -> bool:
 def defense_on(request):
     if not _auth_ok(request):
         return JsonResponse({"detail": "forbidden"}, status=403)
-    cache.set("egisland:defense_enabled", True, timeout=None)
-    return JsonResponse({"defense_enabled": True})
+    return JsonResponse(defense_state.set_enabled(True))
 
 
 @require_POST
 def defense_off(request):
     if not _auth_ok(request):
         return JsonResponse({"detail": "forbidden"}, status=403)
-    cache.set("egisland:defense_enabled", False, timeout=None)
-    return JsonResponse({"defense_enabled": False})
+    return JsonResponse(defense_state.set_enabled(False))
+
+
+@require_GET
+def defense_status(request):
+    if not _auth_ok(request):
+        return JsonResponse({"detail": "forbidden"}, status=403)
+    seq = request.GET.get("seq")
+    return JsonResponse(defense_state.status(int(seq) if seq and seq.isdigit() else None))
+
+
+@require_GET
+def heavy_hitters(request):
+    if not _auth_ok(request):
+        return JsonResponse({"detail": "forbidden"}, status=403)
+    k = request.GET.get("k", "")
+    return JsonResponse(get_heavy_hitters().snapshot(min(int(k), 1000) if k.isdigit() else 20))
+
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def limits(request):
+    if not _auth_ok(request):
+        return JsonResponse({"detail": "forbidden"}, status=403)
+    if request.method == "GET":
+        return JsonResponse(limits_table.describe())
+    try:
+        body = json.loads(request.body or b"{}")
+        raw = body["rules"]
+        rules = None if raw is None else limits_table.parse_rules(raw)
+    except (ValueError, KeyError, TypeError) as e:
+        return JsonResponse({"detail": f"invalid limits: {e}"}, status=400)
+    return JsonResponse(limits_table.set_rules(rules))
+
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def blocked(request):
+    if not _auth_ok(request):
+        return JsonResponse({"detail": "forbidden"}, status=403)
+    if request.method == "GET":
+        return JsonResponse({"hosts": blocklist.active(), "networks": blocklist.active_networks()})
+    try:
+        target = json.loads(request.body or b"{}")["unblock"]
+        if not isinstance(target, str) or not target:
+            raise ValueError("unblock must be an IP or a network")
+        if "/" in target:
+            return JsonResponse({"unblocked": blocklist.unblock_network(target)})
+        ipaddress.ip_address(target)
+    except (ValueError, KeyError, TypeError) as e:
+        return JsonResponse({"detail": f"invalid unblock: {e}"}, status=400)
+    return JsonResponse({"unblocked": target, "still_blocked_by": blocklist.unblock(target)})
@@ -0,0 +1,178 @@
+"""
+Password checks in a bounded process pool.
+
+Goal for the dissertation experiment:
+- During auth_login_storm, PBKDF2 ran inline in the daphne process, so the
+  storm used the CPU and the GIL that state and secure requests need. Hashing
+  now runs in separate worker processes, and the token endpoint sheds load
+  quickly instead of queueing without limit.
+
+How it works:
+- check(password, encoded) sends django.contrib.auth.hashers.check_password
+  to a ProcessPoolExecutor of EGISLAND_HASH_WORKERS processes (spawned, each
+  runs django.setup() once) and waits for the result. Only the waiting
+  request thread blocks. It holds no GIL while it waits.
+- At most EGISLAND_HASH_WORKERS + EGISLAND_HASH_QUEUE checks are in flight,
+  counting timed-out checks whose hash is still running (a slot is freed
+  when the hash really ends, not when the request gives up on it).
+  Past that, and on EGISLAND_HASH_TIMEOUT_SECONDS, HashPoolBusy is raised:
+  a DRF 503 with Retry-After, returned before any hashing is done.
+- Unknown usernames still pay one hash (against a throwaway password), like
+  ModelBackend, so response time does not reveal which usernames exist.
+- Legacy hashes are not upgraded on login (check_password gets no setter,
+  because the worker process cannot save the user).
+
+Metrics: egisland_hash_queue_wait_seconds (submit -> worker start),
+egisland_hash_seconds (time in the hasher), egisland_hash_inflight,
+egisland_hash_rejected_total{reason}.
+
+Env:
+- EGISLAND_HASH_POOL              1/0 (default 1; 0 = hash inline as before)
+- EGISLAND_HASH_WORKERS           hashing processes (default 2)
+- EGISLAND_HASH_QUEUE             checks allowed to wait for a worker (default 8)
+- EGISLAND_HASH_TIMEOUT_SECONDS   longest wait for a result (default 5)
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from rest_framework.exceptions import APIException
+
+from .metrics_custom import (
+    hash_inflight,
+    hash_queue_wait_seconds,
+    hash_rejected_total,
+    hash_seconds,
+)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def _env_bool(name: str, default: bool = False) -> bool:
+    v = os.getenv(name)
+    if v is None:
+        return default
+    return v.strip().lower() in ("1", "true", "yes", "on")
+
+
+ENABLED = _env_bool("EGISLAND_HASH_POOL", True)
+WORKERS = max(1, _env_int("EGISLAND_HASH_WORKERS", 2))
+QUEUE = max(0, _env_int("EGISLAND_HASH_QUEUE", 8))
+TIMEOUT_SECONDS = max(0.1, _env_float("EGISLAND_HASH_TIMEOUT_SECONDS", 5.0))
+
+
+class HashPoolBusy(APIException):
+    status_code = 503
+    default_detail = "Authentication is busy, retry shortly."
+    default_code = "hash_pool_busy"
+    wait = 1  # DRF's exception handler turns this into Retry-After
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+_lock = threading.Lock()
+_inflight = 0
+
+
+def _init_worker() -> None:
+    import django
+
+    django.setup()
+
+
+def _verify(password: str, encoded: Optional[str], submitted_at: float):
+    """Runs in a pool process. Returns (ok, queue_wait_s, hash_s)."""
+    from django.contrib.auth.hashers import check_password, make_password
+
+    started = time.time()
+    if encoded is None:
+        make_password(password)  # unknown user: same cost, always False
+        ok = False
+    else:
+        ok = check_password(password, encoded)
+    return ok, started - submitted_at, time.time() - started
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(
+                    max_workers=WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+    return _executor
+
+
+def _reset_executor(broken: ProcessPoolExecutor) -> None:
+    global _executor
+    with _lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _release(_future=None) -> None:
+    global _inflight
+    with _lock:
+        _inflight -= 1
+        hash_inflight.set(_inflight)
+
+
+def check(password: str, encoded: Optional[str]) -> bool:
+    """check_password(password, encoded) in the pool; encoded=None hashes a dummy."""
+    global _inflight
+    with _lock:
+        if _inflight >= WORKERS + QUEUE:
+            hash_rejected_total.labels(reason="queue_full").inc()
+            raise HashPoolBusy()
+        _inflight += 1
+        hash_inflight.set(_inflight)
+
+    executor = _get_executor()
+    try:
+        future = executor.submit(_verify, password, encoded, time.time())
+    except RuntimeError as e:
+        # Broken (BrokenProcessPool) or shut-down executor: nothing was queued
+        _release()
+        _reset_executor(executor)
+        hash_rejected_total.labels(reason="broken_pool" if isinstance(e, BrokenProcessPool) else "shutdown").inc()
+        raise HashPoolBusy()
+    # The slot is held until the hash really ends: cancel() cannot stop one
+    # already running in a worker, so a timed-out check still occupies it.
+    future.add_done_callback(_release)
+
+    try:
+        ok, waited, hashed = future.result(timeout=TIMEOUT_SECONDS)
+    except TimeoutError:
+        future.cancel()
+        hash_rejected_total.labels(reason="timeout").inc()
+        raise HashPoolBusy()
+    except BrokenProcessPool:
+        _reset_executor(executor)
+        hash_rejected_total.labels(reason="broken_pool").inc()
+        raise HashPoolBusy()
+
+    hash_queue_wait_seconds.observe(max(0.0, waited))
+    hash_seconds.observe(hashed)
+    return ok
@@ -0,0 +1,193 @@
+"""
+Top-K heavy hitters of the protected API traffic (Space-Saving sketches).
+
+Goal for the dissertation experiment:
+- During a flood, show which clients dominate the traffic live (Prometheus and
+  an admin endpoint) instead of post-processing locust CSVs.
+
+How it works:
+- Two Space-Saving summaries per window: (ip, path) and (jwt subject, path).
+  Each keeps at most EGISLAND_HH_CAPACITY counters, so memory is fixed however
+  many distinct (spoofed) IPs arrive. A new key takes over the smallest
+  counter and inherits its count as the error bound; every key whose true
+  count exceeds total / capacity is guaranteed to be present.
+- The minimum counter is found through a heap with lazy updates (a counter's
+  heap entry is refreshed only when it surfaces at the top), so both hits and
+  take-overs are O(log capacity) amortized.
+- Windows rotate every EGISLAND_HH_WINDOW_SECONDS; the last completed window
+  is kept next to the current one.
+- The subject is read from the bearer token payload without verifying the
+  signature (this runs before authentication). A forged subject only inflates
+  its own entry; use the (ip, path) view for attribution.
+
+Exported as the gauge egisland_heavy_hitter_requests{sketch, client, path}
+(current window, top EGISLAND_HH_EXPORT entries) and as JSON from
+GET /api/admin/defense/heavy-hitters. Both are per worker process.
+
+Env:
+- EGISLAND_HH_CAPACITY         counters per sketch (default 1024)
+- EGISLAND_HH_WINDOW_SECONDS   window length (default 60)
+- EGISLAND_HH_EXPORT           entries exported to Prometheus per sketch (default 20)
+"""
+
+from __future__ import annotations
+
+import base64
+import heapq
+import json
+import os
+import threading
+import time
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from prometheus_client.core import REGISTRY, GaugeMetricFamily
+
+SKETCHES = ("ip_path", "subject_path")
+
+# Longest bearer token we bother decoding for its subject.
+MAX_TOKEN_LENGTH = 4096
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+class SpaceSaving:
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self.total = 0
+        self._counts: Dict[Hashable, List[int]] = {}  # key -> [count, error]
+        self._heap: List[Tuple[int, Hashable]] = []   # one (count when pushed, key) per key
+
+    def add(self, key: Hashable, n: int = 1) -> None:
+        self.total += n
+        entry = self._counts.get(key)
+        if entry is not None:
+            entry[0] += n
+            return
+        if len(self._counts) < self.capacity:
+            self._counts[key] = [n, 0]
+            heapq.heappush(self._heap, (n, key))
+            return
+
+        # Take over the smallest counter. Heap counts can only lag behind the
+        # real ones, so refresh the top until it is exact.
+        while True:
+            count, victim = self._heap[0]
+            actual = self._counts[victim][0]
+            if actual == count:
+                break
+            heapq.heapreplace(self._heap, (actual, victim))
+        del self._counts[victim]
+        self._counts[key] = [count + n, count]
+        heapq.heapreplace(self._heap, (count + n, key))
+
+    def top(self, k: int) -> List[Tuple[Hashable, int, int]]:
+        """[(key, count, error)] for the k largest counters; count - error <= true count <= count."""
+        best = heapq.nlargest(k, self._counts.items(), key=lambda kv: kv[1][0])
+        return [(key, c[0], c[1]) for key, c in best]
+
+
+def token_subject(authorization: Optional[str]) -> Optional[str]:
+    """The unverified "user_id" claim of a bearer token, or None."""
+    if not authorization or not authorization.startswith("Bearer ") or len(authorization) > MAX_TOKEN_LENGTH:
+        return None
+    parts = authorization[7:].split(".")
+    if len(parts) != 3:
+        return None
+    try:
+        payload = parts[1] + "=" * (-len(parts[1]) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+        subject = claims.get("user_id", claims.get("sub"))
+    except Exception:
+        return None
+    return None if subject is None else str(subject)
+
+
+class HeavyHitters:
+    def __init__(self, capacity: int = 1024, window_seconds: int = 60, export: int = 20):
+        self.capacity = capacity
+        self.window_seconds = max(1, window_seconds)
+        self.export = export
+        self._lock = threading.Lock()
+        self._window_started = time.time()
+        self._current = self._new_window()
+        self._previous: Optional[Dict[str, SpaceSaving]] = None
+        self._previous_started = None
+
+    @classmethod
+    def from_env(cls) -> "HeavyHitters":
+        return cls(
+            capacity=_env_int("EGISLAND_HH_CAPACITY", 1024),
+            window_seconds=_env_int("EGISLAND_HH_WINDOW_SECONDS", 60),
+            export=_env_int("EGISLAND_HH_EXPORT", 20),
+        )
+
+    def _new_window(self) -> Dict[str, SpaceSaving]:
+        return {name: SpaceSaving(self.capacity) for name in SKETCHES}
+
+    def _rotate(self, now: float) -> None:
+        if now - self._window_started >= self.window_seconds:
+            self._previous, self._previous_started = self._current, self._window_started
+            self._current = self._new_window()
+            self._window_started = now
+
+    def record(self, ip: str, path: str, authorization: Optional[str] = None) -> None:
+        subject = token_subject(authorization)
+        with self._lock:
+            self._rotate(time.time())
+            self._current["ip_path"].add((ip, path))
+            if subject is not None:
+                self._current["subject_path"].add((subject, path))
+
+    def snapshot(self, k: int) -> dict:
+        with self._lock:
+            self._rotate(time.time())
+            windows = {"current": (self._window_started, self._current)}
+            if self._previous is not None:
+                windows["previous"] = (self._previous_started, self._previous)
+
+            out = {"window_seconds": self.window_seconds}
+            for label, (started, sketches) in windows.items():
+                out[label] = {"started_at": started}
+                for name, sketch in sketches.items():
+                    out[label][name] = {
+                        "total": sketch.total,
+                        "top": [
+                            {"client": key[0], "path": key[1], "count": count, "error": error}
+                            for key, count, error in sketch.top(k)
+                        ],
+                    }
+        return out
+
+    def collect(self):
+        """prometheus_client custom-collector hook."""
+        gauge = GaugeMetricFamily(
+            "egisland_heavy_hitter_requests",
+            "Requests of the top clients per path in the current heavy-hitter window (upper bound)",
+            labels=["sketch", "client", "path"],
+        )
+        with self._lock:
+            self._rotate(time.time())
+            rows = [(name, sketch.top(self.export)) for name, sketch in self._current.items()]
+        for name, top in rows:
+            for (client, path), count, _ in top:
+                gauge.add_metric([name, client, path], count)
+        yield gauge
+
+
+_hitters: Optional[HeavyHitters] = None
+_hitters_lock = threading.Lock()
+
+
+def get_heavy_hitters() -> HeavyHitters:
+    global _hitters
+    if _hitters is None:
+        with _hitters_lock:
+            if _hitters is None:
+                _hitters = HeavyHitters.from_env()
+                REGISTRY.register(_hitters)
+    return _hitters
@@ -0,0 +1,261 @@
+"""
+JWT authentication with a per-process validation cache.
+
+Goal for the dissertation experiment:
+- In secure_valid_only every request re-verified the same access token (HMAC)
+  and loaded the same User from sqlite. A repeat token should cost a hash and
+  two dict lookups: no crypto, no DB query.
+
+How it works:
+- Tokens: bounded LRU (EGISLAND_JWT_CACHE_SIZE entries) keyed by the
+  blake2b-128 digest of the raw token (jwt_precheck.token_digest), holding
+  the validated token only. An entry expires at the token's own "exp"
+  claim, so the cache never accepts a token SimpleJWT would reject as
+  expired.
+- Users are resolved on every request, cache hit or not: tokens carrying
+  the "roles" claim (roles.py) are self-contained, and the CachedUser (id,
+  username, roles) is built from the claims, with no DB read at all. Older
+  tokens without it go through a second LRU keyed by user id
+  (EGISLAND_JWT_USER_CACHE_SIZE entries), filled from one DB read and kept
+  for EGISLAND_JWT_USER_TTL seconds.
+- Invalidation:
+  * logout / denylist: the token's jti and login family
+    (refresh_rotation.py) are checked against token_denylist.py (in-memory
+    mirror kept in sync by broadcast) on every request, cached or not;
+  * deactivating or deleting a User revokes all of its tokens issued so far
+    (token_denylist.revoke_user, same mirror), and any save broadcasts
+    "jwt_user_changed" so every worker drops that user and their cached
+    tokens (apps.py connects the signals).
+
+Tokens that fail validation or are revoked go into the negative cache of
+jwt_precheck.py, so JWTPrecheckMiddleware answers their repeats.
+
+Only the API sees CachedUser; it is not a model instance, so code needing the
+real User must load it.
+
+Env:
+- EGISLAND_JWT_CACHE_SIZE        cached tokens per process (default 10000)
+- EGISLAND_JWT_USER_CACHE_SIZE   cached users per process (default 10000)
+- EGISLAND_JWT_USER_TTL          seconds a cached user is trusted (default 60)
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+from django.db.models.signals import post_delete
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from . import broadcast, token_denylist
+from .jwt_precheck import remember_invalid, token_digest
+from .refresh_rotation import family_of, family_revoked
+from .roles import ADMIN, ROLES_CLAIM, USERNAME_CLAIM, roles_for
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+class _ExpiringLRU:
+    """OrderedDict LRU whose entries carry their own expiry (epoch seconds)."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = max(1, maxsize)
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            if time.time() >= item[0]:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return item[1]
+
+    def put(self, key: Hashable, value: Any, expires_at: float) -> None:
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def drop_where(self, predicate: Callable[[Any], bool]) -> None:
+        with self._lock:
+            for key in [k for k, (_, v) in self._data.items() if predicate(v)]:
+                del self._data[key]
+
+
+@dataclass(frozen=True)
+class CachedUser:
+    """Snapshot of the User fields the API reads (permissions, throttles, views)."""
+
+    id: Any
+    username: str
+    is_active: bool
+    is_staff: bool
+    is_superuser: bool
+    roles: Tuple[str, ...] = ()
+
+    is_authenticated = True
+    is_anonymous = False
+
+    @property
+    def pk(self):
+        return self.id
+
+    def get_username(self) -> str:
+        return self.username
+
+    def __str__(self) -> str:
+        return self.username
+
+    @classmethod
+    def from_user(cls, user) -> "CachedUser":
+        return cls(
+            id=user.pk,
+            username=user.get_username(),
+            is_active=user.is_active,
+            is_staff=user.is_staff,
+            is_superuser=user.is_superuser,
+            roles=roles_for(user),
+        )
+
+    @classmethod
+    def from_claims(cls, user_id: str, validated_token) -> "CachedUser":
+        roles = tuple(validated_token[ROLES_CLAIM])
+        return cls(
+            id=user_id,
+            username=str(validated_token.get(USERNAME_CLAIM, "")),
+            is_active=True,  # deactivation revokes the token instead
+            is_staff=ADMIN in roles,
+            is_superuser=False,
+            roles=roles,
+        )
+
+
+_tokens = _ExpiringLRU(_env_int("EGISLAND_JWT_CACHE_SIZE", 10000))
+_users = _ExpiringLRU(_env_int("EGISLAND_JWT_USER_CACHE_SIZE", 10000))
+USER_TTL_SECONDS = _env_int("EGISLAND_JWT_USER_TTL", 60)
+
+_started = False
+
+
+def start() -> None:
+    global _started
+    if _started:
+        return
+    _started = True
+    token_denylist.start()
+    broadcast.subscribe("jwt_user_changed", _on_user_changed)
+
+
+def _drop_user(user_id) -> None:
+    _users.pop(str(user_id))
+    _tokens.drop_where(lambda token: str(token.get(api_settings.USER_ID_CLAIM)) == str(user_id))
+
+
+def _on_user_changed(message: dict) -> None:
+    _drop_user(message["user_id"])
+
+
+def user_changed(sender, instance, **kwargs) -> None:
+    """post_save / post_delete receiver for the user model."""
+    _drop_user(instance.pk)
+    if kwargs.get("signal") is post_delete or not instance.is_active:
+        try:
+            token_denylist.revoke_user(instance.pk)
+        except Exception:
+            # Refresh is refused already (SimpleJWT checks is_active); access
+            # tokens then run out within ACCESS_TOKEN_LIFETIME.
+            pass
+    try:
+        broadcast.publish("jwt_user_changed", {"user_id": str(instance.pk)})
+    except Exception:
+        # Other workers catch up when their cached user expires
+        # (USER_TTL_SECONDS); revoked tokens are refused through the denylist.
+        pass
+
+
+def verified_subject(authorization: Optional[str]) -> Optional[str]:
+    """
+    The user id of a bearer token this worker has already validated (token
+    cache hit), else None. Safe to key on before authentication runs: a
+    forged token never gets into the cache.
+    """
+    parts = authorization.split() if authorization else ()
+    if len(parts) != 2 or parts[0] != "Bearer":
+        return None
+    validated_token = _tokens.get(token_digest(parts[1].encode("latin-1")))
+    if validated_token is None:
+        return None
+    subject = validated_token.get(api_settings.USER_ID_CLAIM)
+    return None if subject is None else str(subject)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        start()
+        digest = token_digest(raw_token)
+        validated_token = _tokens.get(digest)
+        if validated_token is None:
+            try:
+                validated_token = self.get_validated_token(raw_token)
+            except InvalidToken:
+                remember_invalid(raw_token)  # JWTPrecheckMiddleware rejects it next time
+                raise
+            _tokens.put(digest, validated_token, float(validated_token["exp"]))
+
+        # Not cached with the token, so USER_TTL_SECONDS bounds a stale user.
+        user = self.get_user(validated_token)
+        jti = validated_token.get(api_settings.JTI_CLAIM)
+        cutoff = token_denylist.revoked_before(user.pk)
+        if (
+            (jti is not None and token_denylist.is_revoked(jti))
+            or (cutoff and validated_token.get("iat", 0) <= cutoff)
+            or family_revoked(family_of(validated_token))
+        ):
+            remember_invalid(raw_token)
+            raise InvalidToken(_("Token has been revoked"))
+        return user, validated_token
+
+    def get_user(self, validated_token) -> CachedUser:
+        try:
+            user_id = str(validated_token[api_settings.USER_ID_CLAIM])
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        if ROLES_CLAIM in validated_token:
+            return CachedUser.from_claims(user_id, validated_token)
+
+        user = _users.get(user_id)
+        if user is None:
+            # DB read plus SimpleJWT's is_active / revoke-claim checks.
+            user = CachedUser.from_user(super().get_user(validated_token))
+            _users.put(user_id, user, time.time() + USER_TTL_SECONDS)
+        return user
@@ -0,0 +1,256 @@
+"""
+Asymmetric JWT signing with a key ring (kid header) and rotation without restart.
+
+Goal for the dissertation experiment:
+- With HS256 and SIGNING_KEY = SECRET_KEY every worker that can verify a token
+  can also mint one, and changing the key means restarting everything. With
+  the key ring, verifier-only workers hold public keys only, and keys rotate
+  while workers keep serving.
+
+How it works:
+- Public keys live in Redis, hash "egisland:jwt:keys" (kid -> {"alg",
+  "public", "created"}). The kid that signs new tokens is in
+  "egisland:jwt:active_kid".
+- Each worker mirrors the ring. Every public key is parsed once per kid and
+  kept, so verification looks up the token's "kid" header in a dict and runs
+  the signature check only. The mirror reloads when the broadcast listener
+  connects, on a "jwt_keys" broadcast (python manage.py jwt_keys rotate /
+  retire), and at most once a second on an unknown kid during full
+  validation. The request-path checks (algorithm_allowed, pending_kid) only
+  read the mirror, so they never block an event loop on Redis.
+- Private keys are PEM files <kid>.pem in EGISLAND_JWT_KEY_DIR. Only signing
+  workers (token endpoints) need that directory. A worker without the
+  active kid's file can verify but not issue tokens.
+- Rotation: "rotate" adds a key and makes it active. Tokens signed with the
+  old kid stay valid until "retire" removes it (after REFRESH_TOKEN_LIFETIME).
+
+Algorithms: EdDSA (Ed25519) or RS256. Compare them with HS256 using
+python manage.py bench_jwt.
+
+EGISLAND_JWT_KEYRING=0 keeps SimpleJWT's own backend (SIMPLE_JWT ALGORITHM /
+SIGNING_KEY) unchanged.
+
+Env:
+- EGISLAND_JWT_KEYRING   1/0 (default 0)
+- EGISLAND_JWT_KEY_DIR   private key directory (default <BASE_DIR>/jwt_keys)
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import jwt
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.backends import TokenBackend
+from rest_framework_simplejwt.exceptions import TokenBackendError, TokenBackendExpiredToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from . import broadcast
+from .redis_client import get_redis
+
+RING_KEY = "egisland:jwt:keys"
+ACTIVE_KEY = "egisland:jwt:active_kid"
+
+ALGORITHMS = ("EdDSA", "RS256")
+
+RELOAD_MIN_INTERVAL = 1.0
+
+
+def _env_bool(name: str, default: bool = False) -> bool:
+    v = os.getenv(name)
+    if v is None:
+        return default
+    return v.strip().lower() in ("1", "true", "yes", "on")
+
+
+ENABLED = _env_bool("EGISLAND_JWT_KEYRING", False)
+
+
+def key_dir() -> Path:
+    return Path(os.getenv("EGISLAND_JWT_KEY_DIR") or settings.BASE_DIR / "jwt_keys")
+
+
+def _prepare(alg: str, pem: str):
+    return jwt.PyJWS().get_algorithm_by_name(alg).prepare_key(pem)
+
+
+class KeyRing:
+    def __init__(self):
+        self._public: Dict[str, Tuple[str, Any]] = {}  # kid -> (alg, parsed public key)
+        self._private: Dict[str, Any] = {}  # kid -> parsed private key
+        self._active: Optional[str] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._started = False
+        self.version = 0  # bumped when the kids or their algorithms change
+
+    def start(self) -> None:
+        # The first load runs on the broadcast listener thread once it
+        # connects, not on whichever request got here first.
+        if self._started:
+            return
+        self._started = True
+        broadcast.subscribe("jwt_keys", lambda message: self.reload())
+        broadcast.on_connect(self.reload)
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at > 0
+
+    def reload(self) -> None:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.hgetall(RING_KEY)
+        pipe.get(ACTIVE_KEY)
+        rows, active = pipe.execute()
+        with self._lock:
+            public = {}
+            for kid, raw in rows.items():
+                kid = kid.decode()
+                entry = self._public.get(kid)
+                if entry is None:
+                    meta = json.loads(raw)
+                    entry = (meta["alg"], _prepare(meta["alg"], meta["public"]))
+                public[kid] = entry
+            changed = {k: e[0] for k, e in public.items()} != {k: e[0] for k, e in self._public.items()}
+            self._public = public
+            self._private = {kid: key for kid, key in self._private.items() if kid in public}
+            self._active = active.decode() if active else None
+            self._loaded_at = time.monotonic()
+            if changed:
+                self.version += 1
+
+    def verifying_key(self, kid: str) -> Optional[Tuple[str, Any]]:
+        self.start()
+        entry = self._public.get(kid)
+        if entry is None and time.monotonic() - self._loaded_at >= RELOAD_MIN_INTERVAL:
+            # A rotation whose broadcast has not arrived yet, or a made-up kid
+            try:
+                self.reload()
+            except Exception:
+                return None
+            entry = self._public.get(kid)
+        return entry
+
+    def signing_key(self) -> Tuple[str, str, Any]:
+        """(kid, alg, private key) for new tokens."""
+        self.start()
+        if not self.loaded:
+            self.reload()  # token endpoints run in a sync thread, not on the event loop
+        kid = self._active
+        if kid is None or kid not in self._public:
+            raise TokenBackendError(_("No active signing key"))
+        key = self._private.get(kid)
+        if key is None:
+            try:
+                pem = (key_dir() / f"{kid}.pem").read_text()
+            except OSError as e:
+                raise TokenBackendError(_("This worker cannot sign tokens")) from e
+            key = self._private[kid] = _prepare(self._public[kid][0], pem)
+        return kid, self._public[kid][0], key
+
+    def algorithms(self) -> frozenset:
+        self.start()
+        return frozenset(alg for alg, _key in self._public.values())
+
+    def knows(self, kid: str) -> bool:
+        self.start()
+        return kid in self._public
+
+
+ring = KeyRing()
+
+
+def allowed_algorithms() -> frozenset:
+    if ENABLED:
+        return ring.algorithms()
+    return frozenset({api_settings.ALGORITHM})
+
+
+def algorithm_allowed(alg) -> bool:
+    return alg in allowed_algorithms()
+
+
+def pending_kid(alg, kid) -> bool:
+    """
+    True if a header names a key ring algorithm and a kid this worker has not
+    loaded (yet): a rotation whose broadcast has not arrived. Full validation
+    reloads the ring for it; the precheck must not refuse it, and must not
+    reload on the request path either.
+    """
+    if not ENABLED or alg not in ALGORITHMS or not isinstance(kid, str):
+        return False
+    return not ring.loaded or not ring.knows(kid)
+
+
+def ring_version() -> int:
+    """Changes whenever the set of kids or allowed algorithms changes."""
+    return ring.version if ENABLED else 0
+
+
+class KeyRingTokenBackend(TokenBackend):
+    """TokenBackend that signs with the active kid and verifies by the token's kid."""
+
+    def encode(self, payload: Dict[str, Any]) -> str:
+        if not ENABLED:
+            return super().encode(payload)
+        kid, alg, key = ring.signing_key()
+        jwt_payload = payload.copy()
+        if self.audience is not None:
+            jwt_payload["aud"] = self.audience
+        if self.issuer is not None:
+            jwt_payload["iss"] = self.issuer
+        return jwt.encode(jwt_payload, key, algorithm=alg, headers={"kid": kid}, json_encoder=self.json_encoder)
+
+    def decode(self, token, verify: bool = True) -> Dict[str, Any]:
+        if not ENABLED or not verify:
+            return super().decode(token, verify=verify)
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+        except jwt.InvalidTokenError as e:
+            raise TokenBackendError(_("Token is invalid")) from e
+        entry = ring.verifying_key(kid) if isinstance(kid, str) else None
+        if entry is None:
+            raise TokenBackendError(_("Token is invalid"))
+        alg, key = entry
+        try:
+            return jwt.decode(
+                token,
+                key,
+                algorithms=[alg],
+                audience=self.audience,
+                issuer=self.issuer,
+                leeway=self.get_leeway(),
+                options={"verify_aud": self.audience is not None},
+            )
+        except jwt.ExpiredSignatureError as e:
+            raise TokenBackendExpiredToken(_("Token is expired")) from e
+        except jwt.InvalidTokenError as e:
+            raise TokenBackendError(_("Token is invalid")) from e
+
+
+token_backend = KeyRingTokenBackend(
+    api_settings.ALGORITHM,
+    api_settings.SIGNING_KEY,
+    api_settings.VERIFYING_KEY,
+    api_settings.AUDIENCE,
+    api_settings.ISSUER,
+    None,
+    api_settings.LEEWAY,
+    api_settings.JSON_ENCODER,
+)
+
+
+class RingAccessToken(AccessToken):
+    _token_backend = token_backend
+
+
+class RingRefreshToken(RefreshToken):
+    _token_backend = token_backend
+    access_token_class = RingAccessToken
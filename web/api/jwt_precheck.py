@@ -0,0 +1,192 @@
+"""
+Fast reject of malformed or known-bad bearer tokens (before DRF and SimpleJWT).
+
+Goal for the dissertation experiment:
+- In secure_mixed most invalid requests carry random strings or
+  "this.is.not.a.jwt". Each went through SimpleJWT decoding, DRF exception
+  handling and response rendering just to produce the same 401.
+
+How it works:
+- JWTPrecheckMiddleware looks at "Authorization: Bearer <token>" on
+  EGISLAND_JWT_PRECHECK_PREFIXES (default /api/secure/) and answers 401 with a
+  pre-encoded body when:
+  * shape: not three non-empty base64url segments;
+  * alg: the header segment is not JSON naming an allowed algorithm
+    (SIMPLE_JWT ALGORITHM, or the key ring's algorithms when
+    EGISLAND_JWT_KEYRING=1; "none" never is). Accepted headers are memoized,
+    since every token we issue shares a handful of them; the memo is
+    cleared whenever the ring's kids or algorithms change. A ring algorithm
+    with a kid this worker has not loaded yet is passed on unmemoized, so a
+    rotation whose broadcast is still in flight is not refused: full
+    validation reloads the ring for it;
+  * negative cache: the token's digest is in a small LRU of tokens that
+    failed full validation recently (CachedJWTAuthentication adds them).
+- Anything else continues to CachedJWTAuthentication unchanged. The checks
+  only read in-process state (the key ring mirror is filled by the broadcast
+  listener thread), so the middleware does no I/O and runs the same way in
+  sync and async mode.
+- It sits after AbuseProtectionMiddleware: a flood of garbage tokens is
+  still seen by the blocklist, limiter, anomaly detector and heavy hitters.
+
+The body and WWW-Authenticate header match what DRF sends for InvalidToken
+(without the per-token-class "messages" list).
+
+Env:
+- EGISLAND_JWT_PRECHECK_PREFIXES   comma-separated path prefixes (default /api/secure/)
+- EGISLAND_JWT_NEGATIVE_CACHE      rejected token digests kept (default 4096)
+- EGISLAND_JWT_NEGATIVE_TTL        seconds a digest is kept (default 300)
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Set
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.http import HttpResponse
+from .jwt_keys import algorithm_allowed, pending_kid, ring_version
+from .metrics_custom import jwt_precheck_rejects_total
+
+_SHAPE = re.compile(r"[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+")
+
+# Longest token worth inspecting; anything larger is rejected on shape.
+MAX_TOKEN_LENGTH = 4096
+MAX_KNOWN_HEADERS = 64
+
+UNAUTHORIZED_BODY = json.dumps(
+    {"detail": "Given token not valid for any token type", "code": "token_not_valid"}
+).encode("utf-8")
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def token_digest(raw_token: bytes) -> bytes:
+    return hashlib.blake2b(raw_token, digest_size=16).digest()
+
+
+class _NegativeCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self._data: "OrderedDict[bytes, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, digest: bytes) -> bool:
+        expires_at = self._data.get(digest)
+        if expires_at is None:
+            return False
+        if time.time() >= expires_at:
+            with self._lock:
+                self._data.pop(digest, None)
+            return False
+        return True
+
+    def add(self, digest: bytes) -> None:
+        with self._lock:
+            self._data[digest] = time.time() + self.ttl
+            self._data.move_to_end(digest)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+negative_cache = _NegativeCache(
+    _env_int("EGISLAND_JWT_NEGATIVE_CACHE", 4096), _env_int("EGISLAND_JWT_NEGATIVE_TTL", 300)
+)
+
+# Header segments that passed the alg check, valid for one key ring version.
+_known_headers: Set[str] = set()
+_known_version = 0
+
+
+def remember_invalid(raw_token: bytes) -> None:
+    """Called by the authentication class when a token fails validation."""
+    negative_cache.add(token_digest(raw_token))
+
+
+def _header_ok(segment: str) -> bool:
+    global _known_headers, _known_version
+    version = ring_version()
+    if version != _known_version:
+        _known_headers, _known_version = set(), version
+    if segment in _known_headers:
+        return True
+    try:
+        header = json.loads(base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4)))
+        if not isinstance(header, dict):
+            return False
+        ok = algorithm_allowed(header.get("alg"))
+        if not ok and pending_kid(header.get("alg"), header.get("kid")):
+            return True  # left to full validation, not memoized
+    except Exception:
+        ok = False
+    # Only accepted headers are kept: garbage cannot fill the memo, and a
+    # rejection is never remembered past a ring reload.
+    if ok and len(_known_headers) < MAX_KNOWN_HEADERS:
+        _known_headers.add(segment)
+    return ok
+
+
+def reject_reason(raw_token: str) -> Optional[str]:
+    """"shape", "alg" or "negative" if the token can be rejected without crypto, else None."""
+    if len(raw_token) > MAX_TOKEN_LENGTH or not _SHAPE.fullmatch(raw_token):
+        return "shape"
+    if not _header_ok(raw_token.partition(".")[0]):
+        return "alg"
+    if token_digest(raw_token.encode("ascii")) in negative_cache:
+        return "negative"
+    return None
+
+
+def unauthorized_response() -> HttpResponse:
+    response = HttpResponse(UNAUTHORIZED_BODY, content_type="application/json", status=401)
+    response["WWW-Authenticate"] = 'Bearer realm="api"'
+    return response
+
+
+class JWTPrecheckMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefixes = tuple(
+            p.strip()
+            for p in os.getenv("EGISLAND_JWT_PRECHECK_PREFIXES", "/api/secure/").split(",")
+            if p.strip()
+        )
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self._precheck(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        return self._precheck(request) or await self.get_response(request)
+
+    def _precheck(self, request) -> Optional[HttpResponse]:
+        header = request.META.get("HTTP_AUTHORIZATION")
+        if not header or not header.startswith("Bearer ") or not request.path.startswith(self.prefixes):
+            return None
+        parts = header.split()
+        if len(parts) != 2:
+            return None  # DRF reports malformed headers itself
+        reason = reject_reason(parts[1])
+        if reason is None:
+            return None
+        jwt_precheck_rejects_total.labels(reason=reason).inc()
+        return unauthorized_response()
@@ -0,0 +1,242 @@
+"""
+Per-endpoint limits table, compiled into a radix tree, reloadable at runtime.
+
+Goal for the dissertation experiment:
+- AbuseProtectionMiddleware tested every protected prefix with startswith()
+  on each request, then special-cased /api/auth/token in code. Routes and
+  their limits are now data: one table of rules, one longest-prefix lookup per
+  request. The lookup cost depends on the depth of the tree, not on the
+  number of routes.
+
+Rules (LimitRule):
+- prefix           path prefix, plain startswith() semantics; the longest
+                   matching prefix wins
+- window_seconds, max_requests   the RateLimit for that route
+- cost             cells one request consumes (default 1)
+- key              limiter key strategy:
+  * "ip_path" (default) one bucket per client IP and full path
+  * "ip"      one bucket per client IP for the whole prefix
+  * "subject" one bucket per user for the prefix, once the bearer token has
+              been validated by this worker (jwt_cache.verified_subject).
+              Unvalidated, forged or absent tokens share the client IP's
+              bucket, so minting fresh "user_id" claims buys no budget
+  * "global"  one bucket for the prefix, shared by all clients
+
+Sources, first present wins:
+1. Redis "egisland:defense:limits" (JSON list of rules), written by
+   POST /api/admin/defense/limits. Every worker recompiles on the
+   "defense_limits" broadcast and on (re)connect.
+2. EGISLAND_DEFENSE_LIMITS (the same JSON, at startup).
+3. EGISLAND_DEFENSE_PATH_PREFIXES with EGISLAND_DEFENSE_WINDOW_SECONDS /
+   EGISLAND_DEFENSE_MAX_REQUESTS, and half the limit (at least 10) on
+   /api/auth/token, as before.
+
+A reload swaps in a newly compiled tree in one assignment, so requests in
+flight never see a half-built table.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from . import broadcast
+from .jwt_cache import verified_subject
+from .ratelimit import RateLimit
+from .redis_client import get_redis
+
+LIMITS_KEY = "egisland:defense:limits"
+
+KEY_STRATEGIES = ("ip_path", "ip", "subject", "global")
+
+DEFAULT_PREFIXES = "/api/auth/token/,/api/secure/ping,/api/secure/state"
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+@dataclass(frozen=True)
+class LimitRule:
+    prefix: str
+    window_seconds: int
+    max_requests: int
+    cost: int = 1
+    key: str = "ip_path"
+    limit: RateLimit = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        if not self.prefix.startswith("/"):
+            raise ValueError(f"prefix must start with '/': {self.prefix!r}")
+        if self.window_seconds < 1 or self.max_requests < 1 or self.cost < 1:
+            raise ValueError(f"window_seconds, max_requests and cost must be >= 1 ({self.prefix})")
+        if self.key not in KEY_STRATEGIES:
+            raise ValueError(f"key must be one of {KEY_STRATEGIES}: {self.key!r}")
+        object.__setattr__(self, "limit", RateLimit(self.window_seconds, self.max_requests))
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LimitRule":
+        return cls(
+            prefix=str(data["prefix"]),
+            window_seconds=int(data["window_seconds"]),
+            max_requests=int(data["max_requests"]),
+            cost=int(data.get("cost", 1)),
+            key=str(data.get("key", "ip_path")),
+        )
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data.pop("limit")
+        return data
+
+    def limiter_key(self, ip: str, path: str, authorization: Optional[str]) -> str:
+        if self.key == "ip_path":
+            return f"egisland:rl:{ip}:{path}"
+        if self.key == "ip":
+            return f"egisland:rl:{ip}:{self.prefix}"
+        if self.key == "subject":
+            subject = verified_subject(authorization)
+            if subject is None:
+                return f"egisland:rl:{ip}:{self.prefix}"
+            return f"egisland:rl:sub:{subject}:{self.prefix}"
+        return f"egisland:rl:all:{self.prefix}"
+
+
+class _Node:
+    __slots__ = ("edges", "rule")
+
+    def __init__(self):
+        # first character -> (edge label, child)
+        self.edges: Dict[str, Tuple[str, "_Node"]] = {}
+        self.rule: Optional[LimitRule] = None
+
+
+class LimitsTable:
+    """Radix tree of rule prefixes; match(path) returns the longest matching rule."""
+
+    def __init__(self, rules: List[LimitRule]):
+        self.rules = tuple(sorted(rules, key=lambda r: r.prefix))
+        self._root = _Node()
+        for rule in self.rules:
+            self._insert(rule)
+
+    def _insert(self, rule: LimitRule) -> None:
+        node, rest = self._root, rule.prefix
+        while rest:
+            edge = node.edges.get(rest[0])
+            if edge is None:
+                child = _Node()
+                node.edges[rest[0]] = (rest, child)
+                node, rest = child, ""
+                break
+            label, child = edge
+            common = 0
+            while common < min(len(label), len(rest)) and label[common] == rest[common]:
+                common += 1
+            if common < len(label):
+                # Split the edge at the first differing character
+                middle = _Node()
+                middle.edges[label[common]] = (label[common:], child)
+                node.edges[rest[0]] = (label[:common], middle)
+                child = middle
+            node, rest = child, rest[common:]
+        node.rule = rule
+
+    def match(self, path: str) -> Optional[LimitRule]:
+        node, i, best = self._root, 0, None
+        n = len(path)
+        while True:
+            if node.rule is not None:
+                best = node.rule
+            if i >= n:
+                return best
+            edge = node.edges.get(path[i])
+            if edge is None or not path.startswith(edge[0], i):
+                return best
+            i += len(edge[0])
+            node = edge[1]
+
+
+def parse_rules(raw) -> List[LimitRule]:
+    """Rules from JSON text or an already decoded list; raises ValueError if invalid."""
+    data = json.loads(raw) if isinstance(raw, (str, bytes)) else raw
+    if not isinstance(data, list):
+        raise ValueError("limits must be a JSON list of rules")
+    try:
+        rules = [LimitRule.from_dict(item) for item in data]
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"invalid rule: {e}") from e
+    prefixes = [r.prefix for r in rules]
+    if len(set(prefixes)) != len(prefixes):
+        raise ValueError("duplicate prefix")
+    return rules
+
+
+def env_rules() -> List[LimitRule]:
+    raw = os.getenv("EGISLAND_DEFENSE_LIMITS")
+    if raw:
+        return parse_rules(raw)
+    window = _env_int("EGISLAND_DEFENSE_WINDOW_SECONDS", 10)
+    max_requests = _env_int("EGISLAND_DEFENSE_MAX_REQUESTS", 50)
+    prefixes = [
+        p.strip() for p in os.getenv("EGISLAND_DEFENSE_PATH_PREFIXES", DEFAULT_PREFIXES).split(",") if p.strip()
+    ]
+    return [
+        LimitRule(
+            prefix,
+            window,
+            max(10, max_requests // 2) if prefix.startswith("/api/auth/token") else max_requests,
+        )
+        for prefix in dict.fromkeys(prefixes)
+    ]
+
+
+_defaults = LimitsTable([])
+_table = _defaults
+_started = False
+
+
+def current() -> LimitsTable:
+    return _table
+
+
+def start() -> None:
+    global _started, _defaults, _table
+    if _started:
+        return
+    _started = True
+    _defaults = _table = LimitsTable(env_rules())
+    broadcast.subscribe("defense_limits", lambda message: _reload())
+    broadcast.on_connect(_reload)
+
+
+def _reload() -> None:
+    global _table
+    raw = get_redis().get(LIMITS_KEY)
+    _table = LimitsTable(parse_rules(raw)) if raw else _defaults
+
+
+def set_rules(rules: Optional[List[LimitRule]]) -> dict:
+    """Store a new table for every worker (None = back to the env defaults)."""
+    global _table
+    r = get_redis()
+    if rules is None:
+        r.delete(LIMITS_KEY)
+        _table = _defaults
+    else:
+        r.set(LIMITS_KEY, json.dumps([rule.to_dict() for rule in rules]))
+        _table = LimitsTable(rules)
+    listeners = broadcast.publish("defense_limits", {})
+    return {**describe(), "workers_notified": listeners}
+
+
+def describe() -> dict:
+    return {
+        "source": "runtime" if _table is not _defaults else "env",
+        "rules": [rule.to_dict() for rule in _table.rules],
+    }
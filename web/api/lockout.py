@@ -0,0 +1,107 @@
+"""
+Per-username exponential lockout for the token endpoint.
+
+Goal for the dissertation experiment:
+- The existing token endpoint limits (DRF auth_token scope, nginx api_auth zone)
+  are per IP. A storm spread over many IPs against one username still paid a
+  full PBKDF2 check per attempt. A locked username is now rejected by one
+  Redis call, before the DB or the hasher.
+
+How it works (Redis):
+- "egisland:lock:fail:{username}"  failed attempts; TTL refreshed to
+                                   EGISLAND_LOCKOUT_WINDOW_SECONDS on each failure
+- "egisland:lock:until:{username}" present while locked (PX = lock length)
+- locked_for(username): one PTTL. The same work is done whether or not the
+  username exists, and a locked request never reaches the backend.
+- record_failure(username): one Lua call increments the counter and, from the
+  EGISLAND_LOCKOUT_THRESHOLD-th failure on, locks for
+  base * 2^(failures - threshold), capped at EGISLAND_LOCKOUT_MAX_SECONDS.
+- record_success(username): clears the counter.
+- Redis errors fail open (no lockout) so a Redis outage cannot lock everyone out.
+
+Env:
+- EGISLAND_LOCKOUT_THRESHOLD        failures before the first lock (default 5)
+- EGISLAND_LOCKOUT_BASE_SECONDS     first lock length (default 1)
+- EGISLAND_LOCKOUT_MAX_SECONDS      longest lock (default 900)
+- EGISLAND_LOCKOUT_WINDOW_SECONDS   failures are forgotten after this quiet time (default 900)
+"""
+
+from __future__ import annotations
+
+import os
+
+from .metrics_custom import lockout_total
+from .redis_client import get_redis
+
+FAIL_KEY = "egisland:lock:fail:{username}"
+LOCK_KEY = "egisland:lock:until:{username}"
+
+MAX_USERNAME_LENGTH = 150
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+THRESHOLD = max(1, _env_int("EGISLAND_LOCKOUT_THRESHOLD", 5))
+BASE_MS = max(1, _env_int("EGISLAND_LOCKOUT_BASE_SECONDS", 1)) * 1000
+MAX_MS = max(1, _env_int("EGISLAND_LOCKOUT_MAX_SECONDS", 900)) * 1000
+WINDOW_SECONDS = max(1, _env_int("EGISLAND_LOCKOUT_WINDOW_SECONDS", 900))
+
+# KEYS[1] = fail key, KEYS[2] = lock key
+# ARGV = window_seconds, threshold, base_ms, max_ms
+# Returns the lock length in ms (0 = not locked).
+FAILURE_LUA = """
+local n = redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+local over = n - tonumber(ARGV[2])
+if over < 0 then
+  return 0
+end
+local ms = math.floor(math.min(tonumber(ARGV[4]), tonumber(ARGV[3]) * 2 ^ math.min(over, 30)))
+redis.call('SET', KEYS[2], n, 'PX', ms)
+return ms
+"""
+
+_script = None
+
+
+def _keys(username: str):
+    username = username[:MAX_USERNAME_LENGTH]
+    return FAIL_KEY.format(username=username), LOCK_KEY.format(username=username)
+
+
+def locked_for(username: str) -> float:
+    """Seconds left on the username's lock (0.0 if not locked)."""
+    try:
+        ms = int(get_redis().pttl(_keys(username)[1]))
+    except Exception:
+        return 0.0
+    if ms > 0:
+        lockout_total.labels(event="rejected").inc()
+        return ms / 1000.0
+    return 0.0
+
+
+def record_failure(username: str) -> float:
+    """Count a failed login; returns the lock length in seconds it started (0.0 if none)."""
+    global _script
+    try:
+        if _script is None:
+            _script = get_redis().register_script(FAILURE_LUA)
+        ms = int(_script(keys=list(_keys(username)), args=[WINDOW_SECONDS, THRESHOLD, BASE_MS, MAX_MS]))
+    except Exception:
+        return 0.0
+    if ms:
+        lockout_total.labels(event="locked").inc()
+    return ms / 1000.0
+
+
+def record_success(username: str) -> None:
+    try:
+        get_redis().delete(_keys(username)[0])
+    except Exception:
+        pass
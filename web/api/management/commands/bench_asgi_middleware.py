@@ -0,0 +1,98 @@
+"""
+Measure what running AbuseProtectionMiddleware natively async saves on the
+daphne path, compared with the sync middleware Django has to adapt.
+
+  python manage.py bench_asgi_middleware --concurrency 50,200,1000 --seconds 3
+
+Modes:
+- "hop":    the middleware in sync mode, wrapped the way Django adapts a
+            sync-only middleware in an async chain: sync_to_async(mw,
+            thread_sensitive=True), with the async view behind async_to_sync.
+            Every request crosses into the shared sync thread and back.
+- "native": the middleware in async mode awaiting the async view directly.
+
+--concurrency coroutines issue requests back to back (closed loop) across
+--clients distinct IPs against a view that does nothing, so the numbers are
+middleware + adaptation cost only. Point EGISLAND_REDIS_URL at the Redis you
+want to measure.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+
+import numpy as np
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from api.abuse_middleware import AbuseProtectionMiddleware, DefensePolicy
+from api.ratelimit import build_limiter
+
+
+async def _view(request):
+    return HttpResponse()
+
+
+class Command(BaseCommand):
+    help = "Benchmark sync_to_async-adapted vs async-native AbuseProtectionMiddleware."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--modes", default="hop,native")
+        parser.add_argument("--concurrency", default="50,200,1000", help="comma-separated in-flight request counts")
+        parser.add_argument("--seconds", type=float, default=3.0)
+        parser.add_argument("--clients", type=int, default=200, help="distinct client IPs")
+        parser.add_argument("--limiter", default="lease")
+        parser.add_argument("--path", default="/api/secure/ping")
+
+    def handle(self, *args, **opts):
+        factory = RequestFactory()
+        requests = [
+            factory.get(opts["path"], REMOTE_ADDR=f"10.1.{(i // 250) % 250}.{i % 250}")
+            for i in range(opts["clients"])
+        ]
+        modes = [m.strip() for m in opts["modes"].split(",") if m.strip()]
+
+        for concurrency in [int(c) for c in opts["concurrency"].split(",") if c.strip()]:
+            for mode in modes:
+                handler = self._build(mode, opts["limiter"])
+                samples = asyncio.run(self._run(handler, requests, concurrency, opts["seconds"]))
+                p50, p99 = np.percentile(samples, [50, 99])
+                self.stdout.write(
+                    f"c={concurrency:>5} {mode:>6}: {len(samples) / opts['seconds']:,.0f} req/s  "
+                    f"p50={p50:.1f}us  p99={p99:.1f}us  max={samples.max():.1f}us"
+                )
+
+    def _build(self, mode: str, limiter: str):
+        policy = DefensePolicy()
+        policy.limiter = build_limiter(limiter)
+        policy.runtime_enabled = lambda: True
+
+        if mode == "native":
+            mw = AbuseProtectionMiddleware(_view)
+            mw.policy = policy
+            return mw
+        if mode == "hop":
+            mw = AbuseProtectionMiddleware(async_to_sync(_view))
+            mw.policy = policy
+            return sync_to_async(mw, thread_sensitive=True)
+        raise ValueError(f"unknown mode {mode!r}")
+
+    async def _run(self, handler, requests, concurrency: int, seconds: float) -> np.ndarray:
+        deadline = time.perf_counter() + seconds
+        results = []
+
+        async def worker(offset: int):
+            samples = []
+            i = offset
+            while time.perf_counter() < deadline:
+                t0 = time.perf_counter()
+                await handler(requests[i % len(requests)])
+                samples.append((time.perf_counter() - t0) * 1e6)
+                i += concurrency
+            results.append(samples)
+
+        await asyncio.gather(*(worker(k) for k in range(concurrency)))
+        return np.fromiter((s for samples in results for s in samples), dtype=float)
@@ -0,0 +1,80 @@
+"""
+Compare JWT signing and verification cost for HS256, RS256 and EdDSA (Ed25519).
+
+  python manage.py bench_jwt --seconds 2
+
+For each algorithm a throwaway key is generated and an access token shaped
+like ours (user_id, roles, username, jti, exp, iat, kid header) is signed and
+verified back to back with PyJWT and a pre-parsed key. This is the same work
+KeyRingTokenBackend does per uncached token (jwt_cache.py skips it for
+repeats). Reported: operations per second and the p50/p99 per operation, for
+sign (token endpoint) and verify (every worker).
+"""
+
+from __future__ import annotations
+
+import secrets
+import time
+import uuid
+
+import jwt
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from api.management.commands.jwt_keys import generate
+
+
+def _keys(alg: str):
+    """(signing key, verifying key), parsed once like the key ring does."""
+    if alg == "HS256":
+        key = secrets.token_bytes(32)
+        return key, key
+    private_pem, public_pem = generate(alg)
+    prepared = jwt.PyJWS().get_algorithm_by_name(alg)
+    return prepared.prepare_key(private_pem), prepared.prepare_key(public_pem)
+
+
+def _payload() -> dict:
+    now = int(time.time())
+    return {
+        "token_type": "access",
+        "exp": now + 900,
+        "iat": now,
+        "jti": uuid.uuid4().hex,
+        "user_id": "1",
+        "roles": ["player"],
+        "username": "bench",
+    }
+
+
+class Command(BaseCommand):
+    help = "Benchmark JWT sign/verify for HS256, RS256 and EdDSA."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--algorithms", default="HS256,RS256,EdDSA")
+        parser.add_argument("--seconds", type=float, default=2.0, help="per algorithm and operation")
+
+    def handle(self, *args, **opts):
+        for alg in [a.strip() for a in opts["algorithms"].split(",") if a.strip()]:
+            signing_key, verifying_key = _keys(alg)
+            headers = {"kid": "bench"}
+            payload = _payload()
+            token = jwt.encode(payload, signing_key, algorithm=alg, headers=headers)
+
+            sign = self._measure(lambda: jwt.encode(payload, signing_key, algorithm=alg, headers=headers), opts["seconds"])
+            verify = self._measure(lambda: jwt.decode(token, verifying_key, algorithms=[alg]), opts["seconds"])
+            for name, samples in (("sign", sign), ("verify", verify)):
+                p50, p99 = np.percentile(samples, [50, 99])
+                self.stdout.write(
+                    f"{alg:>6} {name:>6}: {len(samples) / (samples.sum() / 1e6):>9,.0f} ops/s  "
+                    f"p50={p50:.1f}us  p99={p99:.1f}us  token={len(token)}B"
+                )
+
+    def _measure(self, fn, seconds: float) -> np.ndarray:
+        samples = []
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - t0) * 1e6)
+        return np.array(samples)
@@ -0,0 +1,80 @@
+"""
+Redis memory per tracked client for each limiter backend (spoofed-IP flood).
+
+  python manage.py bench_keyspace --clients 100000 --backends fixed,gcra,window
+
+For each backend, --clients distinct spoofed IPs (100.64.0.0/10) send one
+request each to --path. The command reports the growth of Redis used_memory
+and of the key count, and memory per client. The limit uses a window length
+nothing else uses (--window), and afterwards only keys for those IPs and that
+window are deleted. Still, point EGISLAND_REDIS_URL at a Redis without other
+traffic: used_memory is global.
+"""
+
+from __future__ import annotations
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.ratelimit import RateLimit, build_limiter
+from api.redis_client import get_redis
+
+
+def _ip(i: int) -> str:
+    return f"100.{64 + ((i >> 16) & 63)}.{(i >> 8) & 255}.{i & 255}"
+
+
+class Command(BaseCommand):
+    help = "Measure Redis memory per client for the limiter backends."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--backends", default="fixed,gcra,window")
+        parser.add_argument("--clients", type=int, default=100000)
+        parser.add_argument("--window", type=int, default=17, help="window seconds (keep it unique)")
+        parser.add_argument("--path", default="/api/secure/ping")
+
+    def handle(self, *args, **opts):
+        r = get_redis()
+        limit = RateLimit(window_seconds=opts["window"], max_requests=50)
+        clients = min(opts["clients"], 1 << 22)
+
+        for name in [b.strip() for b in opts["backends"].split(",") if b.strip()]:
+            limiter = build_limiter(name)
+            self._cleanup(r, opts["window"])
+            before_memory, before_keys = self._memory(r), r.dbsize()
+
+            started = time.perf_counter()
+            for i in range(clients):
+                limiter.hit(f"egisland:rl:{_ip(i)}:{opts['path']}", limit)
+            elapsed = time.perf_counter() - started
+
+            grown = self._memory(r) - before_memory
+            self.stdout.write(
+                f"{name:>12}: {clients:,} clients in {elapsed:.1f}s  "
+                f"+{grown / 1e6:,.1f} MB  +{r.dbsize() - before_keys:,} keys  "
+                f"{grown / clients:,.1f} B/client{self._encoding(r, opts['window'])}"
+            )
+            self._cleanup(r, opts["window"])
+
+    @staticmethod
+    def _memory(r) -> int:
+        return int(r.info("memory")["used_memory"])
+
+    @staticmethod
+    def _encoding(r, window: int) -> str:
+        for key in r.scan_iter(match=f"egisland:rlw:{window}:*", count=1000):
+            return f"  (bucket encoding: {r.object('encoding', key).decode()}, {r.hlen(key)} fields)"
+        return ""
+
+    @staticmethod
+    def _cleanup(r, window: int) -> None:
+        for pattern in ("*egisland:rl:100.*", f"egisland:rlw:{window}:*"):
+            batch = []
+            for key in r.scan_iter(match=pattern, count=1000):
+                batch.append(key)
+                if len(batch) >= 1000:
+                    r.unlink(*batch)
+                    batch = []
+            if batch:
+                r.unlink(*batch)
@@ -0,0 +1,69 @@
+"""
+Compare per-request overhead of the limiter backends inside
+AbuseProtectionMiddleware at a fixed offered load.
+
+  python manage.py bench_ratelimit --rate 5000 --seconds 5 --backends fixed,gcra,lease,shm
+
+Requests are paced open-loop at --rate (schedule-based, so a slow backend
+shows up as lag rather than a lower rate) across --clients distinct IPs.
+Each sample is the time spent in process_request(). Point EGISLAND_REDIS_URL /
+CACHES at the Redis you want to measure.
+"""
+
+from __future__ import annotations
+
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from api.abuse_middleware import AbuseProtectionMiddleware, DefensePolicy
+from api.ratelimit import build_limiter
+
+
+class Command(BaseCommand):
+    help = "Benchmark limiter backends (p50/p99 overhead) at a target request rate."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--backends", default="fixed,gcra,lease,shm")
+        parser.add_argument("--rate", type=int, default=5000, help="offered requests per second")
+        parser.add_argument("--seconds", type=float, default=5.0)
+        parser.add_argument("--clients", type=int, default=200, help="distinct client IPs")
+        parser.add_argument("--path", default="/api/secure/ping")
+
+    def handle(self, *args, **opts):
+        factory = RequestFactory()
+        n = int(opts["rate"] * opts["seconds"])
+        requests = [
+            factory.get(opts["path"], REMOTE_ADDR=f"10.0.{(i // 250) % 250}.{i % 250}")
+            for i in range(opts["clients"])
+        ]
+
+        for name in [b.strip() for b in opts["backends"].split(",") if b.strip()]:
+            policy = DefensePolicy()
+            policy.limiter = build_limiter(name)
+            policy.runtime_enabled = lambda: True
+            mw = AbuseProtectionMiddleware(lambda r: HttpResponse())
+            mw.policy = policy
+
+            samples = np.empty(n)
+            blocked = 0
+            interval = 1.0 / opts["rate"]
+            start = time.perf_counter()
+            for i in range(n):
+                due = start + i * interval
+                while time.perf_counter() < due:
+                    pass
+                t0 = time.perf_counter()
+                if mw.process_request(requests[i % len(requests)]) is not None:
+                    blocked += 1
+                samples[i] = (time.perf_counter() - t0) * 1e6
+            elapsed = time.perf_counter() - start
+
+            p50, p99 = np.percentile(samples, [50, 99])
+            self.stdout.write(
+                f"{name:>6}: achieved={n / elapsed:,.0f} req/s  p50={p50:.1f}us  "
+                f"p99={p99:.1f}us  max={samples.max():.1f}us  blocked={blocked}/{n}"
+            )
@@ -0,0 +1,92 @@
+"""
+Measure refresh-storm throughput with and without rotation.
+
+  python manage.py bench_refresh --username bench --seconds 3 --threads 1,8,32
+
+--threads workers each hold their own login (refresh token) and refresh it
+back to back through RoleTokenRefreshSerializer (the work the refresh view
+does minus HTTP and throttling). In "rotate" mode every response replaces the
+worker's refresh token, so each call pays the reuse check (one SET NX) and
+the signing of a second token. "plain" reuses one refresh token and mints
+access tokens only, as before rotation.
+
+Also printed: Redis MEMORY USAGE of one used-jti marker, the per-token cost
+of a refresh storm.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from unittest import mock
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.settings import api_settings
+
+from api.redis_client import get_redis
+from api.refresh_rotation import used_key
+from api.roles import RoleTokenObtainPairSerializer, RoleTokenRefreshSerializer
+
+
+def _refresh(token: str) -> dict:
+    serializer = RoleTokenRefreshSerializer(data={"refresh": token})
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data
+
+
+class Command(BaseCommand):
+    help = "Benchmark token refresh with and without rotation."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--username", required=True, help="existing active user to refresh for")
+        parser.add_argument("--modes", default="plain,rotate")
+        parser.add_argument("--threads", default="1,8,32")
+        parser.add_argument("--seconds", type=float, default=3.0)
+
+    def handle(self, *args, **opts):
+        user = get_user_model().objects.filter(username=opts["username"], is_active=True).first()
+        if user is None:
+            raise CommandError(f"no active user {opts['username']!r}")
+
+        for threads in [int(t) for t in opts["threads"].split(",") if t.strip()]:
+            for mode in [m.strip() for m in opts["modes"].split(",") if m.strip()]:
+                with mock.patch.object(api_settings, "ROTATE_REFRESH_TOKENS", mode == "rotate"):
+                    samples = self._run(user, threads, opts["seconds"])
+                p50, p99 = np.percentile(samples, [50, 99])
+                self.stdout.write(
+                    f"threads={threads:>3} {mode:>6}: {len(samples) / opts['seconds']:,.0f} refresh/s  "
+                    f"p50={p50:.0f}us  p99={p99:.0f}us"
+                )
+
+        token = RoleTokenObtainPairSerializer.get_token(user)
+        try:
+            with mock.patch.object(api_settings, "ROTATE_REFRESH_TOKENS", True):
+                _refresh(str(token))
+            usage = get_redis().memory_usage(used_key(token[api_settings.JTI_CLAIM]))
+            self.stdout.write(f"used-jti marker: {usage} bytes in Redis")
+        except Exception as e:
+            self.stdout.write(f"used-jti marker: MEMORY USAGE unavailable ({e})")
+
+    def _run(self, user, threads: int, seconds: float) -> np.ndarray:
+        deadline = time.perf_counter() + seconds
+        results = []
+        lock = threading.Lock()
+
+        def worker():
+            token = str(RoleTokenObtainPairSerializer.get_token(user))
+            samples = []
+            while time.perf_counter() < deadline:
+                t0 = time.perf_counter()
+                token = _refresh(token).get("refresh", token)
+                samples.append((time.perf_counter() - t0) * 1e6)
+            with lock:
+                results.extend(samples)
+
+        pool = [threading.Thread(target=worker) for _ in range(threads)]
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+        return np.array(results)
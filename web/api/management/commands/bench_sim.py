@@ -0,0 +1,44 @@
+"""
+Micro-benchmark for the vectorized tick engine.
+
+  python manage.py bench_sim --assets 1000,5000,20000 --ticks 500
+
+Reports p50/p99/max milliseconds per tick for each asset count (the count is
+used for generation units and demand nodes; storage is a tenth of it).
+"""
+
+from __future__ import annotations
+
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from api.simulation import IslandSimulation, SimConfig
+
+
+class Command(BaseCommand):
+    help = "Benchmark IslandSimulation.step() for several asset counts."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--assets", default="1000,2000,5000,20000")
+        parser.add_argument("--ticks", type=int, default=500)
+        parser.add_argument("--warmup", type=int, default=20)
+
+    def handle(self, *args, **opts):
+        sizes = [int(s) for s in opts["assets"].split(",") if s.strip()]
+        for n in sizes:
+            sim = IslandSimulation(SimConfig(units=n, loads=n, storage=max(1, n // 10)))
+            for _ in range(opts["warmup"]):
+                sim.step()
+
+            samples = np.empty(opts["ticks"])
+            for i in range(opts["ticks"]):
+                t0 = time.perf_counter()
+                sim.step()
+                samples[i] = (time.perf_counter() - t0) * 1000.0
+
+            p50, p99 = np.percentile(samples, [50, 99])
+            self.stdout.write(
+                f"assets={n:>6}  p50={p50:.3f}ms  p99={p99:.3f}ms  max={samples.max():.3f}ms"
+            )
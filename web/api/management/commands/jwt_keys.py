@@ -0,0 +1,102 @@
+"""
+Manage the JWT key ring (api/jwt_keys.py) while workers keep running.
+
+  python manage.py jwt_keys rotate [--alg RS256|EdDSA]
+  python manage.py jwt_keys retire <kid>
+  python manage.py jwt_keys list
+
+rotate writes the private key to EGISLAND_JWT_KEY_DIR/<kid>.pem (mode 0600),
+publishes the public key, makes the new kid active and broadcasts "jwt_keys"
+so every worker reloads. Retire a kid only after REFRESH_TOKEN_LIFETIME:
+tokens it signed are rejected once it is gone.
+
+RS256 is the default: verification (every worker, every uncached token) is
+several times cheaper than Ed25519, and signing only happens at the token
+endpoints (see bench_jwt).
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import secrets
+import time
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from django.core.management.base import BaseCommand, CommandError
+
+from api import broadcast
+from api.jwt_keys import ACTIVE_KEY, ALGORITHMS, RING_KEY, key_dir
+from api.redis_client import get_redis
+
+
+def generate(alg: str):
+    """(private PEM, public PEM) for a new key."""
+    if alg == "EdDSA":
+        private = ed25519.Ed25519PrivateKey.generate()
+    elif alg == "RS256":
+        private = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    else:
+        raise CommandError(f"unsupported algorithm {alg!r} (choose from {', '.join(ALGORITHMS)})")
+    private_pem = private.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    public_pem = private.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return private_pem.decode(), public_pem.decode()
+
+
+class Command(BaseCommand):
+    help = "Rotate, retire or list JWT signing keys."
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=["rotate", "retire", "list"])
+        parser.add_argument("kid", nargs="?")
+        parser.add_argument("--alg", default="RS256", choices=ALGORITHMS)
+
+    def handle(self, *args, **opts):
+        getattr(self, f"_{opts['action']}")(opts)
+
+    def _rotate(self, opts):
+        kid = secrets.token_hex(8)
+        private_pem, public_pem = generate(opts["alg"])
+
+        directory = key_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{kid}.pem"
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(private_pem)
+
+        r = get_redis()
+        pipe = r.pipeline()
+        pipe.hset(RING_KEY, kid, json.dumps({"alg": opts["alg"], "public": public_pem, "created": time.time()}))
+        pipe.set(ACTIVE_KEY, kid)
+        pipe.execute()
+        reached = broadcast.publish("jwt_keys", {"active": kid})
+        self.stdout.write(f"active kid {kid} ({opts['alg']}), private key {path}, {reached} workers notified")
+
+    def _retire(self, opts):
+        kid = opts["kid"]
+        if not kid:
+            raise CommandError("retire needs a kid")
+        r = get_redis()
+        active = r.get(ACTIVE_KEY)
+        if active and active.decode() == kid:
+            raise CommandError("refusing to retire the active kid; rotate first")
+        if not r.hdel(RING_KEY, kid):
+            raise CommandError(f"unknown kid {kid}")
+        (key_dir() / f"{kid}.pem").unlink(missing_ok=True)
+        reached = broadcast.publish("jwt_keys", {"retired": kid})
+        self.stdout.write(f"retired {kid}, {reached} workers notified")
+
+    def _list(self, opts):
+        r = get_redis()
+        active = (r.get(ACTIVE_KEY) or b"").decode()
+        for kid, raw in sorted(r.hgetall(RING_KEY).items(), key=lambda kv: json.loads(kv[1])["created"]):
+            meta = json.loads(raw)
+            kid = kid.decode()
+            created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(meta["created"]))
+            self.stdout.write(f"{kid}  {meta['alg']:<6} {created}{'  active' if kid == active else ''}")
@@ -0,0 +1,178 @@
+"""
+Push the active Redis blocklists down to nginx as a geo include.
+
+  python manage.py nginx_blocklist --reload-cmd "docker compose exec -T nginx nginx -s reload"
+
+Goal for the dissertation experiment:
+- A blocked IP was still proxied by nginx to daphne, which only then answered
+  403. Under a flood the blocked requests kept occupying Django workers.
+  With the include in place nginx answers them itself and they never reach
+  the upstream.
+
+How it works:
+- Every --interval seconds the active entries are read from the sorted sets
+  that hold them, without SCAN:
+  * "egisland:blocked" and "egisland:cidr:blocked" (api/blocklist.py,
+    hosts and escalated networks) on EGISLAND_REDIS_URL
+  * "abuse:blocked" and "abuse:cidr:blocked" (backend AbuseBlockMiddleware)
+    on --abuse-redis-url, if given (e.g. redis://127.0.0.1:6379/1)
+- The union (validated with ipaddress, capped at --max-entries, soonest
+  expiry dropped first) is rendered as
+      geo $egisland_blocked { default 0; 203.0.113.7 1; 198.51.100.0/24 1; ... }
+  and written to --output via a temp file and rename, so nginx never reads
+  half a file. infra/nginx.conf includes it and returns 403 when the
+  variable is set. geo does its own longest-prefix match, so networks need
+  no expansion.
+- The file is only rewritten when the set of IPs changes, and nginx is
+  reloaded at most once per --min-reload-interval. A change inside that
+  interval stays pending until the next allowed reload. Expiry is handled the
+  same way: an IP that leaves the sorted set leaves the file on the next pass.
+- Redis or reload errors are logged and retried on the next pass; the last
+  written file stays in place.
+
+Django keeps enforcing the same blocklists, so nginx lagging by up to
+--interval + --min-reload-interval only costs those requests a trip upstream.
+"""
+
+from __future__ import annotations
+
+import ipaddress
+import os
+import shlex
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+import redis
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.blocklist import INDEX_KEY
+from api.cidr_blocklist import CidrBlocklist
+from api.redis_client import get_redis
+
+ABUSE_INDEX_KEY = "abuse:blocked"
+
+NETWORK_KEYS = {"egisland": CidrBlocklist("egisland").key, "abuse": CidrBlocklist("abuse").key}
+
+GEO_VARIABLE = "$egisland_blocked"
+
+
+def _active(client, key: str, now: float) -> Dict[str, float]:
+    rows = client.zrangebyscore(key, now, "+inf", withscores=True)
+    return {(ip.decode() if isinstance(ip, bytes) else ip): score for ip, score in rows}
+
+
+def render(ips) -> str:
+    lines = [
+        "# Generated by manage.py nginx_blocklist; do not edit.",
+        f"geo {GEO_VARIABLE} {{",
+        "    default 0;",
+    ]
+    lines.extend(f"    {ip} 1;" for ip in ips)
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+class Command(BaseCommand):
+    help = "Render the active Redis blocklists as an nginx geo include and reload nginx."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            default=str(Path(settings.BASE_DIR).parent / "infra" / "nginx-blocklist" / "blocked.conf"),
+        )
+        parser.add_argument("--abuse-redis-url", default=os.getenv("ABUSE_REDIS_URL", ""))
+        parser.add_argument("--interval", type=float, default=2.0, help="seconds between Redis reads")
+        parser.add_argument("--min-reload-interval", type=float, default=5.0)
+        parser.add_argument("--max-entries", type=int, default=100000)
+        parser.add_argument("--reload-cmd", default="nginx -s reload", help="empty: write the file only")
+        parser.add_argument("--once", action="store_true", help="one pass, then exit")
+
+    def handle(self, *args, **opts):
+        self.opts = opts
+        self.output = Path(opts["output"])
+        self.abuse = redis.Redis.from_url(opts["abuse_redis_url"]) if opts["abuse_redis_url"] else None
+        self.written: Optional[tuple] = self._read_existing()
+        self.pending = False
+        self.last_reload = 0.0
+
+        while True:
+            started = time.monotonic()
+            try:
+                self._sync()
+            except Exception as e:
+                self.stderr.write(f"nginx_blocklist: {e}")
+            if opts["once"]:
+                return
+            time.sleep(max(0.0, opts["interval"] - (time.monotonic() - started)))
+
+    def _sync(self) -> None:
+        ips = self._collect()
+        if ips != self.written:
+            self._write(ips)
+            self.written = ips
+            self.pending = True
+            self.stdout.write(f"{self.output}: {len(ips)} blocked")
+        if self.pending and (
+            self.opts["once"] or time.monotonic() - self.last_reload >= self.opts["min_reload_interval"]
+        ):
+            self._reload()
+
+    def _collect(self) -> tuple:
+        now = time.time()
+        sources = [(get_redis(), INDEX_KEY, NETWORK_KEYS["egisland"])]
+        if self.abuse is not None:
+            sources.append((self.abuse, ABUSE_INDEX_KEY, NETWORK_KEYS["abuse"]))
+
+        valid = {}
+        for client, hosts_key, networks_key in sources:
+            # Only literal addresses and networks reach the config file
+            for key, parse in ((hosts_key, ipaddress.ip_address), (networks_key, ipaddress.ip_network)):
+                for entry, expires_at in _active(client, key, now).items():
+                    try:
+                        entry = str(parse(entry))
+                    except ValueError:
+                        continue
+                    valid[entry] = max(expires_at, valid.get(entry, 0.0))
+        if len(valid) > self.opts["max_entries"]:
+            keep = sorted(valid, key=valid.get, reverse=True)[: self.opts["max_entries"]]
+            valid = {ip: valid[ip] for ip in keep}
+        return tuple(sorted(valid))
+
+    def _read_existing(self) -> Optional[tuple]:
+        try:
+            text = self.output.read_text()
+        except OSError:
+            return None
+        ips = [line.split()[0] for line in text.splitlines() if line.strip().endswith(" 1;")]
+        return tuple(sorted(ips))
+
+    def _write(self, ips: tuple) -> None:
+        self.output.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.output.parent, prefix=".blocked.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(render(ips))
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, self.output)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    def _reload(self) -> None:
+        self.last_reload = time.monotonic()
+        if not self.opts["reload_cmd"]:
+            self.pending = False
+            return
+        result = subprocess.run(
+            shlex.split(self.opts["reload_cmd"]), capture_output=True, text=True, timeout=30
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"reload failed ({result.returncode}): {result.stderr.strip()}")
+        self.pending = False
@@ -1,7 +1,84 @@
-from prometheus_client import Counter
+from prometheus_client import Counter, Gauge, Histogram
 
 experiment_marker_total = Counter(
     "experiment_marker_total",
     "Manual markers for experiments",
     ["name"],
 )
+
+cache_requests_total = Counter(
+    "egisland_cache_requests_total",
+    "Cache operations by result (hit, miss, l1_hit, error, fallback)",
+    ["op", "result"],
+)
+
+cache_latency_seconds = Histogram(
+    "egisland_cache_latency_seconds",
+    "Latency of cache operations that reached Redis",
+    ["op"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25),
+)
+
+defense_toggle_effect_seconds = Histogram(
+    "egisland_defense_toggle_effect_seconds",
+    "Delay between a defense on/off publish and a worker applying it",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+anomaly_flags_total = Counter(
+    "egisland_anomaly_flags_total",
+    "Clients flagged by the streaming anomaly detector",
+    ["kind"],
+)
+
+anomaly_tracked_clients = Gauge(
+    "egisland_anomaly_tracked_clients",
+    "Clients currently tracked by the anomaly detector in this process",
+)
+
+login_source_rule_total = Counter(
+    "egisland_login_source_rule_total",
+    "Login attempts stopped by a distinct-source (HyperLogLog) rule",
+    ["rule"],
+)
+
+jwt_precheck_rejects_total = Counter(
+    "egisland_jwt_precheck_rejects_total",
+    "Bearer tokens rejected before SimpleJWT (shape, alg, negative cache)",
+    ["reason"],
+)
+
+hash_queue_wait_seconds = Histogram(
+    "egisland_hash_queue_wait_seconds",
+    "Time a password check waited for a hashing process",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+hash_seconds = Histogram(
+    "egisland_hash_seconds",
+    "Time spent in the password hasher (inside the hashing process)",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+hash_inflight = Gauge(
+    "egisland_hash_inflight",
+    "Password checks running or queued in the hashing pool",
+)
+
+hash_rejected_total = Counter(
+    "egisland_hash_rejected_total",
+    "Password checks refused by the hashing pool (queue_full, timeout, broken_pool)",
+    ["reason"],
+)
+
+lockout_total = Counter(
+    "egisland_lockout_total",
+    "Username lockouts started (locked) and attempts refused while locked (rejected)",
+    ["event"],
+)
+
+refresh_rotation_total = Counter(
+    "egisland_refresh_rotation_total",
+    "Refresh requests by outcome (rotated, reused, revoked, unchecked = Redis down)",
+    ["result"],
+)
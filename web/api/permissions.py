@@ -0,0 +1,37 @@
+"""
+Claims-based permission classes (roles from the JWT, see roles.py).
+
+They read request.user.roles, which CachedJWTAuthentication fills from the
+token, so a permission check is a set intersection: no DB query.
+"""
+
+from __future__ import annotations
+
+from typing import FrozenSet
+
+from rest_framework.permissions import BasePermission
+
+from .roles import ADMIN, ATTACKER_LAB, PLAYER
+
+
+class HasRole(BasePermission):
+    """Allows authenticated users holding at least one of `roles`."""
+
+    roles: FrozenSet[str] = frozenset()
+
+    def has_permission(self, request, view) -> bool:
+        user = request.user
+        if not user or not user.is_authenticated:
+            return False
+        return not self.roles.isdisjoint(getattr(user, "roles", ()))
+
+
+def require_roles(*roles: str) -> type:
+    """HasRole subclass for the given roles, e.g. permission_classes([require_roles(ADMIN)])."""
+    return type(f"HasRole_{'_'.join(roles)}", (HasRole,), {"roles": frozenset(roles)})
+
+
+IsPlayer = require_roles(PLAYER, ADMIN)
+IsAdminRole = require_roles(ADMIN)
+IsAttackerLab = require_roles(ATTACKER_LAB, ADMIN)
+CanReadState = require_roles(PLAYER, ADMIN, ATTACKER_LAB)
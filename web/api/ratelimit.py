@@ -0,0 +1,484 @@
+"""
+Rate-limiter backends used by AbuseProtectionMiddleware.
+
+Backends (select with EGISLAND_DEFENSE_LIMITER):
+- "gcra"  Generic Cell Rate Algorithm in one atomic Redis EVALSHA.
+          State is a single timestamp per key, there are no window edges, so
+          bursts are capped at max_requests instead of 2x at a boundary.
+- "fixed" The original fixed-window counter on the Django cache
+          (cache.add + cache.incr, 2-3 round trips per request).
+- "lease" (default) Two tiers: an in-process token bucket per key answers most requests
+          locally and reserves tokens from the Redis GCRA in batches (leases).
+          Denials are cached locally until retry-after, so a flood against
+          one key costs about one Redis call per lease, not one per request.
+- "window" Sliding-window counters packed as fields of per-window bucket
+          hashes (HashedWindowStore): a few bytes per client instead of a
+          Redis key each, so spoofed-IP floods barely move Redis memory.
+- "window_lease" "lease" with its leases taken from those hashes.
+- "shm"   GCRA table in shared memory (shm_limiter.py), shared by the worker
+          processes of one host; no network at all. Single-host only.
+
+Every backend exposes hit(key, limit, cost=1) -> Decision and the coroutine
+ahit(key, limit, cost=1) for the ASGI path. The Redis Lua backends run
+on redis.asyncio inside the event loop; "fixed" goes through the Django cache,
+which is sync-only, so its ahit() runs hit() in a worker thread; "shm" does
+no I/O and answers inline.
+
+Benchmark: python manage.py bench_ratelimit --rate 5000 --backends fixed,gcra,lease,shm
+Redis memory per client: python manage.py bench_keyspace
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+
+from .redis_client import get_async_redis, get_redis
+
+
+@dataclass
+class RateLimit:
+    window_seconds: int = 10
+    max_requests: int = 50
+
+
+@dataclass
+class Decision:
+    allowed: bool
+    retry_after: float = 0.0  # seconds until the next request would be allowed
+
+
+ALLOW = Decision(True)
+
+
+class FixedWindowLimiter:
+    """
+    Counter per (key, window) on the Django cache.
+    """
+
+    def hit(self, key: str, limit: RateLimit, cost: int = 1) -> Decision:
+        now = time.time()
+        window_seconds = max(1, limit.window_seconds)
+        window = int(now) // window_seconds
+        wkey = f"{key}:{window}"
+
+        # cache.add returns True if key was added (i.e., first request)
+        if cache.add(wkey, cost, timeout=window_seconds + 2):
+            count = cost
+        else:
+            try:
+                count = cache.incr(wkey, cost)
+            except Exception:
+                # Some cache backends don't support incr; fallback to get+set
+                count = int(cache.get(wkey, 0)) + cost
+                cache.set(wkey, count, timeout=window_seconds + 2)
+
+        if count > limit.max_requests:
+            return Decision(False, retry_after=(window + 1) * window_seconds - now)
+        return ALLOW
+
+    async def ahit(self, key: str, limit: RateLimit, cost: int = 1) -> Decision:
+        return await sync_to_async(self.hit, thread_sensitive=False)(key, limit, cost)
+
+
+def _interval_ms(limit: RateLimit) -> int:
+    return max(1, (max(1, limit.window_seconds) * 1000) // max(1, limit.max_requests))
+
+
+def _gcra_args(limit: RateLimit, cells: int) -> list:
+    interval_ms = _interval_ms(limit)
+    return [interval_ms, interval_ms * max(1, limit.max_requests), cells]
+
+
+def _gcra_decision(allowed, retry_ms) -> Decision:
+    if allowed:
+        return ALLOW
+    return Decision(False, retry_after=int(retry_ms) / 1000.0)
+
+
+# KEYS[1] = limiter key
+# ARGV[1] = emission interval T in ms (window / max_requests)
+# ARGV[2] = burst tolerance in ms (T * max_requests)
+# ARGV[3] = cost (cells consumed by this request)
+# Returns {allowed (0/1), retry_after_ms}
+#
+# The key stores the theoretical arrival time (TAT). Server TIME is used so all
+# workers share one clock.
+GCRA_LUA = """
+local t = redis.call('TIME')
+local now = t[1] * 1000 + math.floor(t[2] / 1000)
+local interval = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+
+local tat = tonumber(redis.call('GET', KEYS[1]))
+if not tat or tat < now then
+  tat = now
+end
+
+local new_tat = tat + interval * cost
+local allow_at = new_tat - tolerance
+if now < allow_at then
+  return {0, allow_at - now}
+end
+
+redis.call('SET', KEYS[1], new_tat, 'PX', new_tat - now)
+return {1, 0}
+"""
+
+
+class GcraLimiter:
+    """
+    GCRA in a single Lua round trip. register_script() sends EVALSHA and only
+    falls back to EVAL (script upload) after a NOSCRIPT reply.
+
+    Fails open: if Redis is unreachable the request is allowed, so a Redis
+    outage degrades to "no defense" rather than "no service".
+    """
+
+    def __init__(self, client=None):
+        self._client = client
+        self._script = None
+        self._ascript = None
+
+    def _get_script(self):
+        if self._script is None:
+            self._script = (self._client or get_redis()).register_script(GCRA_LUA)
+        return self._script
+
+    def hit(self, key: str, limit: RateLimit, cost: int = 1) -> Decision:
+        try:
+            allowed, retry_ms = self._get_script()(keys=[key], args=_gcra_args(limit, cost))
+        except Exception:
+            return ALLOW
+        return _gcra_decision(allowed, retry_ms)
+
+    async def ahit(self, key: str, limit: RateLimit, cost: int = 1) -> Decision:
+        client = get_async_redis()
+        if self._ascript is None:
+            self._ascript = client.register_script(GCRA_LUA)
+        try:
+            allowed, retry_ms = await self._ascript(
+                keys=[key], args=_gcra_args(limit, cost), client=client
+            )
+        except Exception:
+            return ALLOW
+        return _gcra_decision(allowed, retry_ms)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+# Same GCRA state as GCRA_LUA, but reserves up to ARGV[3] cells at once and
+# grants however many fit right now.
+# Returns {granted, retry_after_ms}; retry_after_ms is only set when granted == 0.
+GCRA_LEASE_LUA = """
+local t = redis.call('TIME')
+local now = t[1] * 1000 + math.floor(t[2] / 1000)
+local interval = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local want = tonumber(ARGV[3])
+
+local tat = tonumber(redis.call('GET', KEYS[1]))
+if not tat or tat < now then
+  tat = now
+end
+
+local free = math.floor((now + tolerance - tat) / interval)
+if free < 1 then
+  return {0, tat + interval - tolerance - now}
+end
+
+local granted = math.min(want, free)
+local new_tat = tat + interval * granted
+redis.call('SET', KEYS[1], new_tat, 'PX', new_tat - now)
+return {granted, 0}
+"""
+
+
+class LeasedLimiter:
+    """
+    Local token bucket per key, refilled by leasing tokens from Redis.
+
+    Tokens are reserved in Redis before they are spent locally, so the global
+    limit is never exceeded. The error is on the strict side: tokens leased by
+    one worker and not yet spent are invisible to the others. With W workers
+    and lease size L, at most W * L tokens are stranded, so L is sized as
+
+        L = clamp(floor(error * max_requests / W), 1, EGISLAND_DEFENSE_LEASE_MAX)
+
+    Env:
+    - EGISLAND_WORKERS                 worker processes sharing the limit (default 1)
+    - EGISLAND_DEFENSE_LEASE_ERROR     allowed error as a fraction of max_requests (default 0.1)
+    - EGISLAND_DEFENSE_LEASE_MAX       upper bound on one lease (default 64)
+    - EGISLAND_DEFENSE_LOCAL_KEYS      max keys held in process memory (default 100000)
+
+    A lease is only valid for the time the global bucket needs to produce it,
+    so unspent tokens from a quiet key expire instead of being spent later in
+    a burst. Like GcraLimiter, Redis errors fail open.
+    """
+
+    def __init__(self, client=None):
+        self._client = client
+        self._script = None
+        self._ascript = None
+        self.workers = max(1, _env_int("EGISLAND_WORKERS", 1))
+        self.error = max(0.0, _env_float("EGISLAND_DEFENSE_LEASE_ERROR", 0.1))
+        self.lease_max = max(1, _env_int("EGISLAND_DEFENSE_LEASE_MAX", 64))
+        self.max_keys = max(100, _env_int("EGISLAND_DEFENSE_LOCAL_KEYS", 100000))
+        # key -> [tokens, valid_until, denied_until]
+        self._buckets: dict = {}
+        self._lock = threading.Lock()
+
+    def _get_script(self):
+        if self._script is None:
+            self._script = (self._client or get_redis()).register_script(GCRA_LEASE_LUA)
+        return self._script
+
+    def lease_size(self, limit: RateLimit) -> int:
+        size = int(self.error * max(1, limit.max_requests) / self.workers)
+        return min(max(1, size), self.lease_max)
+
+    def hit_local(self, key: str, cost: int = 1) -> Optional[Decision]:
+        """Answer from the local tier only; None means a lease is needed."""
+        now = time.monotonic()
+        with self._lock:
+            b = self._buckets.get(key)
+            if b is not None:
+                if now < b[2]:
+                    return Decision(False, retry_after=b[2] - now)
+                if b[0] >= cost and now < b[1]:
+                    b[0] -= cost
+                    return ALLOW
+        return None
+
+    def hit(self, key: str, limit: RateLimit, cost: int = 1) -> Decision:
+        decision = self.hit_local(key, cost)
+        if decision is not None:
+            return decision
+
+        # Local tier exhausted: reserve a new lease (outside the lock).
+        want = max(cost, self.lease_size(limit))
+        try:
+            granted, retry_ms = self._reserve(key, limit, want)
+        except Exception:
+            return ALLOW
+        return self._store_lease(key, limit, cost, int(granted), int(retry_ms))
+
+    async def ahit(self, key: str, limit: RateLimit, cost: int = 1) -> Decision:
+        decision = self.hit_local(key, cost)
+        if decision is not None:
+            return decision
+
+        want = max(cost, self.lease_size(limit))
+        try:
+            granted, retry_ms = await self._areserve(key, limit, want)
+        except Exception:
+            return ALLOW
+        return self._store_lease(key, limit, cost, int(granted), int(retry_ms))
+
+    def _reserve(self, key: str, limit: RateLimit, want: int):
+        """Take up to `want` cells from the shared limit: (granted, retry_after_ms)."""
+        return self._get_script()(keys=[key], args=_gcra_args(limit, want))
+
+    async def _areserve(self, key: str, limit: RateLimit, want: int):
+        client = get_async_redis()
+        if self._ascript is None:
+            self._ascript = client.register_script(GCRA_LEASE_LUA)
+        return await self._ascript(keys=[key], args=_gcra_args(limit, want), client=client)
+
+    def _store_lease(self, key: str, limit: RateLimit, cost: int, granted: int, retry_ms: int) -> Decision:
+        interval_ms = _interval_ms(limit)
+        now = time.monotonic()
+        with self._lock:
+            if len(self._buckets) >= self.max_keys:
+                self._evict(now)
+            if granted >= cost:
+                valid_for = granted * interval_ms / 1000.0
+                self._buckets[key] = [granted - cost, now + valid_for, 0.0]
+                return ALLOW
+            retry_after = max(retry_ms, interval_ms) / 1000.0
+            self._buckets[key] = [0, 0.0, now + retry_after]
+            return Decision(False, retry_after=retry_after)
+
+    def _evict(self, now: float) -> None:
+        # Drop idle buckets first; if everything is live, drop the oldest tenth.
+        stale = [k for k, b in self._buckets.items() if now >= b[1] and now >= b[2]]
+        for k in stale:
+            del self._buckets[k]
+        if len(self._buckets) >= self.max_keys:
+            for k in list(self._buckets)[: self.max_keys // 10]:
+                del self._buckets[k]
+
+
+# Sliding-window counter over hashed buckets.
+# KEYS[1] = bucket hash of the current window, KEYS[2] = same bucket, previous window
+# ARGV[1] = field (8-byte key digest)
+# ARGV[2] = max_requests
+# ARGV[3] = cells wanted
+# ARGV[4] = cells needed at least (fewer free -> nothing is taken)
+# ARGV[5] = weight of the previous window in 1/1000 (share of it still inside the sliding window)
+# ARGV[6] = TTL of the current window's hash in seconds
+# Returns {granted, current count, previous count}
+WINDOW_LUA = """
+local cur = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0')
+local prev = tonumber(redis.call('HGET', KEYS[2], ARGV[1]) or '0')
+local free = tonumber(ARGV[2]) - cur - math.floor(prev * tonumber(ARGV[5]) / 1000)
+if free < tonumber(ARGV[4]) then
+  return {0, cur, prev}
+end
+local granted = math.min(tonumber(ARGV[3]), free)
+redis.call('HINCRBY', KEYS[1], ARGV[1], granted)
+redis.call('EXPIRE', KEYS[1], ARGV[6], 'NX')
+return {granted, cur, prev}
+"""
+
+
+class HashedWindowStore:
+    """
+    Sliding-window counters packed into a fixed number of Redis hashes per window.
+
+    A limiter key is reduced to an 8-byte digest. Its counter is a field of
+    "egisland:rlw:{window_seconds}:{window_no}:{bucket}", where bucket is
+    another part of the digest mod EGISLAND_RL_BUCKETS. A flood of spoofed
+    IPs therefore adds hash fields of about 10-20 bytes each in listpack
+    encoding, as long as a bucket holds no more than hash-max-listpack-entries
+    fields (set in docker-compose.yml), instead of one top-level key of about
+    100 bytes with its own expiry. Whole window hashes expire together, after
+    two windows, since the sliding estimate reads the previous window.
+
+    The estimate is cur + prev * (share of the previous window still inside
+    the sliding window), the usual sliding-window approximation. Like the
+    GCRA backends it never lets more than max_requests through in one window.
+
+    Env:
+    - EGISLAND_RL_BUCKETS   hashes per (window length, window) (default 4096)
+    """
+
+    def __init__(self, client=None):
+        self._client = client
+        self._script = None
+        self._ascript = None
+        self.buckets = max(1, _env_int("EGISLAND_RL_BUCKETS", 4096))
+
+    def _get_script(self):
+        if self._script is None:
+            self._script = (self._client or get_redis()).register_script(WINDOW_LUA)
+        return self._script
+
+    def _args(self, key: str, limit: RateLimit, want: int, need: int, now: float):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        bucket = int.from_bytes(digest[8:], "little") % self.buckets
+        window_seconds = max(1, limit.window_seconds)
+        window = int(now // window_seconds)
+        weight = int(1000 * (1.0 - (now - window * window_seconds) / window_seconds))
+        keys = [
+            f"egisland:rlw:{window_seconds}:{window}:{bucket}",
+            f"egisland:rlw:{window_seconds}:{window - 1}:{bucket}",
+        ]
+        return keys, [digest[:8], max(1, limit.max_requests), want, need, weight, 2 * window_seconds + 1]
+
+    @staticmethod
+    def _retry_ms(limit: RateLimit, cost: int, cur: int, prev: int, now: float) -> int:
+        """Time until the estimate leaves room for `cost` cells."""
+        window_seconds = max(1, limit.window_seconds)
+        window_end = (now // window_seconds + 1) * window_seconds
+        room = limit.max_requests - cur - cost
+        if room < 0 or prev <= 0:
+            return int((window_end - now) * 1000) + 1
+        # prev * weight falls linearly to 0 at window_end
+        weight_needed = room / prev
+        weight_now = (window_end - now) / window_seconds
+        return int(max(0.0, weight_now - weight_needed) * window_seconds * 1000) + 1
+
+    def reserve(self, key: str, limit: RateLimit, want: int, need: int):
+        now = time.time()
+        keys, args = self._args(key, limit, want, need, now)
+        granted, cur, prev = self._get_script()(keys=keys, args=args)
+        return int(granted), (0 if granted else self._retry_ms(limit, need, int(cur), int(prev), now))
+
+    async def areserve(self, key: str, limit: RateLimit, want: int, need: int):
+        client = get_async_redis()
+        if self._ascript is None:
+            self._ascript = client.register_script(WINDOW_LUA)
+        now = time.time()
+        keys, args = self._args(key, limit, want, need, now)
+        granted, cur, prev = await self._ascript(keys=keys, args=args, client=client)
+        return int(granted), (0 if granted else self._retry_ms(limit, need, int(cur), int(prev), now))
+
+
+class HashedWindowLimiter:
+    """One HashedWindowStore round trip per request. Fails open like GcraLimiter."""
+
+    def __init__(self, client=None):
+        self.store = HashedWindowStore(client)
+
+    def hit(self, key: str, limit: RateLimit, cost: int = 1) -> Decision:
+        try:
+            granted, retry_ms = self.store.reserve(key, limit, cost, cost)
+        except Exception:
+            return ALLOW
+        return _gcra_decision(granted, retry_ms)
+
+    async def ahit(self, key: str, limit: RateLimit, cost: int = 1) -> Decision:
+        try:
+            granted, retry_ms = await self.store.areserve(key, limit, cost, cost)
+        except Exception:
+            return ALLOW
+        return _gcra_decision(granted, retry_ms)
+
+
+class HashedLeasedLimiter(LeasedLimiter):
+    """LeasedLimiter whose leases come from HashedWindowStore instead of per-key GCRA keys."""
+
+    def __init__(self, client=None):
+        super().__init__(client)
+        self.store = HashedWindowStore(client)
+
+    def _reserve(self, key: str, limit: RateLimit, want: int):
+        return self.store.reserve(key, limit, want, 1)
+
+    async def _areserve(self, key: str, limit: RateLimit, want: int):
+        return await self.store.areserve(key, limit, want, 1)
+
+
+def _shared_memory_limiter():
+    from .shm_limiter import SharedMemoryLimiter  # imports this module
+
+    return SharedMemoryLimiter()
+
+
+LIMITERS = {
+    "fixed": FixedWindowLimiter,
+    "gcra": GcraLimiter,
+    "lease": LeasedLimiter,
+    "shm": _shared_memory_limiter,
+    "window": HashedWindowLimiter,
+    "window_lease": HashedLeasedLimiter,
+}
+
+
+def build_limiter(name: str):
+    try:
+        return LIMITERS[name]()
+    except KeyError:
+        raise ImproperlyConfigured(f"Unknown limiter backend {name!r}; choose one of {sorted(LIMITERS)}")
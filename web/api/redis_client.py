@@ -0,0 +1,52 @@
+"""
+Shared Redis client for the defense layer (rate limiting, blocklists).
+
+Uses settings.EGISLAND_REDIS_URL (env EGISLAND_REDIS_URL), the same Redis the
+channel layer talks to, with the pool options in settings.EGISLAND_REDIS_POOL.
+The client is created lazily so importing the module never opens a connection.
+
+get_async_redis() is the redis.asyncio counterpart for code running on the
+ASGI event loop. asyncio connections belong to the loop that opened them, so
+there is one client (and pool) per running loop.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import weakref
+from typing import Optional
+
+import redis
+import redis.asyncio
+from django.conf import settings
+
+_client: Optional[redis.Redis] = None
+_lock = threading.Lock()
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, redis.asyncio.Redis]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_redis() -> redis.Redis:
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                pool = redis.ConnectionPool.from_url(
+                    settings.EGISLAND_REDIS_URL, **getattr(settings, "EGISLAND_REDIS_POOL", {})
+                )
+                _client = redis.Redis(connection_pool=pool)
+    return _client
+
+
+def get_async_redis() -> redis.asyncio.Redis:
+    """Client for the running event loop (must be called from a coroutine)."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = redis.asyncio.Redis.from_url(
+            settings.EGISLAND_REDIS_URL, **getattr(settings, "EGISLAND_REDIS_POOL", {})
+        )
+        _async_clients[loop] = client
+    return client
@@ -0,0 +1,92 @@
+"""
+Refresh-token rotation with reuse detection.
+
+Goal for the dissertation experiment:
+- With ROTATE_REFRESH_TOKENS off and no blacklist app, a stolen refresh token
+  minted access tokens until it expired (2 h), however often it was replayed.
+
+How it works (Redis):
+- Every refresh token carries a "fam" claim: the jti of the first refresh
+  token of its login. Rotation keeps it, and SimpleJWT copies it into each
+  access token.
+- consume(jti, exp): SET "egisland:rt:<16 raw jti bytes>" "" NX EXAT exp.
+  The key is 28 bytes, the value is empty, and it disappears when the token
+  would have expired anyway. The first use wins. A second use of the same
+  refresh token is a reuse.
+- On reuse the whole family is revoked in token_denylist.py ("fam:<fam>",
+  kept for REFRESH_TOKEN_LIFETIME). Every refresh and access token of that
+  login is rejected from then on, whether it is held by the thief or by the
+  legitimate client, and the user has to log in again. Logout revokes its
+  family the same way.
+- Redis errors fail open (the refresh is rotated without the reuse check),
+  like the rest of the defense layer.
+
+Known trade-off: a client that retries a refresh whose response it lost is
+treated as a reuse.
+
+Benchmark: python manage.py bench_refresh
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Optional
+
+from rest_framework_simplejwt.settings import api_settings
+
+from . import token_denylist
+from .metrics_custom import refresh_rotation_total
+from .redis_client import get_redis
+
+FAMILY_CLAIM = "fam"
+
+USED_PREFIX = b"egisland:rt:"
+
+
+def used_key(jti: str) -> bytes:
+    try:
+        return USED_PREFIX + bytes.fromhex(jti)
+    except ValueError:
+        return USED_PREFIX + jti.encode()
+
+
+def family_of(token) -> Optional[str]:
+    return token.get(FAMILY_CLAIM)
+
+
+def family_revoked(family: Optional[str]) -> bool:
+    return family is not None and token_denylist.is_revoked(f"fam:{family}")
+
+
+def revoke_family(family: str) -> None:
+    token_denylist.revoke(
+        f"fam:{family}", time.time() + api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()
+    )
+
+
+def consume(jti: str, exp: int) -> bool:
+    """Mark the refresh token used; False if it had been used before."""
+    try:
+        first = get_redis().set(used_key(jti), b"", nx=True, exat=int(exp))
+    except Exception:
+        refresh_rotation_total.labels(result="unchecked").inc()
+        return True
+    return bool(first)
+
+
+def rotate(refresh) -> bool:
+    """Consume `refresh` for a rotation. False (family revoked) on reuse or a revoked family."""
+    token_denylist.start()
+    family = family_of(refresh) or refresh[api_settings.JTI_CLAIM]
+    if family_revoked(family):
+        refresh_rotation_total.labels(result="revoked").inc()
+        return False
+    if not consume(refresh[api_settings.JTI_CLAIM], refresh["exp"]):
+        refresh_rotation_total.labels(result="reused").inc()
+        try:
+            revoke_family(family)
+        except Exception:
+            pass
+        return False
+    refresh_rotation_total.labels(result="rotated").inc()
+    return True
@@ -0,0 +1,102 @@
+"""
+Roles carried in the JWT ("roles" claim), stamped when tokens are issued.
+
+Goal for the dissertation experiment:
+- Secure endpoints authorize from the token alone: no User load, no group
+  query per request (permissions.py reads request.user.roles, which
+  CachedJWTAuthentication builds from the claims).
+
+Roles:
+- "admin":        is_staff / is_superuser, or member of the "admin" group
+- "attacker_lab": member of the "attacker_lab" group (load/attack accounts)
+- "player":       member of the "player" group, and every account with no
+                  other role
+
+How it works:
+- RoleTokenObtainPairSerializer (SIMPLE_JWT TOKEN_OBTAIN_SERIALIZER) adds
+  "roles" and "username" to the refresh token; SimpleJWT copies them into
+  each access token.
+- RoleTokenRefreshSerializer (TOKEN_REFRESH_SERIALIZER) restamps them from the
+  User it already loads for the is_active check, so a role change takes effect
+  at the next refresh (at most ACCESS_TOKEN_LIFETIME later). It also rotates
+  the refresh token (refresh_rotation.py).
+- Deactivated or deleted accounts are cut off at once through the jti
+  denylist (token_denylist.revoke_user), not by reading the User.
+"""
+
+from __future__ import annotations
+
+from typing import Tuple
+
+from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from . import refresh_rotation
+from .jwt_keys import RingRefreshToken
+from .refresh_rotation import FAMILY_CLAIM
+
+PLAYER = "player"
+ADMIN = "admin"
+ATTACKER_LAB = "attacker_lab"
+ROLES = (PLAYER, ADMIN, ATTACKER_LAB)
+
+ROLES_CLAIM = "roles"
+USERNAME_CLAIM = "username"
+
+
+def roles_for(user) -> Tuple[str, ...]:
+    """Roles of a User (one group query; only called when a token is issued)."""
+    roles = set(user.groups.filter(name__in=ROLES).values_list("name", flat=True))
+    if user.is_staff or user.is_superuser:
+        roles.add(ADMIN)
+    if not roles:
+        roles.add(PLAYER)
+    return tuple(sorted(roles))
+
+
+def stamp(token, user) -> None:
+    token[ROLES_CLAIM] = list(roles_for(user))
+    token[USERNAME_CLAIM] = user.get_username()
+
+
+class RoleTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = RingRefreshToken
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token[FAMILY_CLAIM] = token[api_settings.JTI_CLAIM]
+        stamp(token, user)
+        return token
+
+
+class RoleTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = RingRefreshToken
+
+    def validate(self, attrs):
+        # TokenRefreshSerializer.validate, with the roles re-read from the user
+        # and rotation through refresh_rotation.py instead of the blacklist app
+        refresh = self.token_class(attrs["refresh"])
+        rotating = api_settings.ROTATE_REFRESH_TOKENS
+        if rotating and not refresh_rotation.rotate(refresh):
+            raise InvalidToken(_("Token has been revoked"))
+
+        user_id = refresh.payload.get(api_settings.USER_ID_CLAIM)
+        user = get_user_model().objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages["no_active_account"], "no_active_account")
+
+        if not rotating:
+            access = refresh.access_token
+            stamp(access, user)
+            return {"access": str(access)}
+
+        refresh.set_jti()
+        refresh.set_exp()
+        refresh.set_iat()
+        stamp(refresh, user)
+        return {"access": str(refresh.access_token), "refresh": str(refresh)}
@@ -0,0 +1,192 @@
+"""
+Shared-memory GCRA table for single-host multi-worker deployments.
+
+Goal for the dissertation experiment:
+- With all daphne workers on one box, every limiter decision still went to
+  Redis (or the lease tier's Redis refill). Here the workers share one
+  mmap-backed table and a decision never leaves the host. Redis is only
+  needed when workers span hosts.
+
+How it works:
+- A fixed-size file in /dev/shm (EGISLAND_SHM_PATH), mapped by every worker:
+  a 64-byte header (magic, slot count, boot id) and EGISLAND_SHM_SLOTS 16-byte slots
+  of (key hash u64, TAT in monotonic microseconds i64). It holds the same
+  GCRA state as GCRA_LUA in ratelimit.py, one integer per key, and the same
+  limits. CLOCK_MONOTONIC is shared by all processes on the host.
+- A key hashes (blake2b-64) to a home slot and probes up to PROBE slots
+  within its stripe. A slot whose TAT has passed holds no state, since GCRA
+  treats it as a fresh key, so expired slots are reused in place: eviction by
+  time, with no sweeper. If every probed slot is live, the one closest to
+  expiry is taken over, erring towards allowing.
+- Python has no atomic operations on mmap memory, so each stripe of
+  STRIPE_SLOTS slots is guarded by an fcntl byte-range lock (across
+  processes) plus a threading.Lock (fcntl locks are per process, not per
+  thread). A decision is one lock/unlock pair and a few struct reads.
+- No I/O besides the lock syscalls, so ahit() just calls hit().
+- TATs are CLOCK_MONOTONIC timestamps, which restart at boot. The header
+  records the kernel's boot id (/proc/sys/kernel/random/boot_id), and the
+  first worker to open a table from an earlier boot clears it, so a file on
+  a disk that outlived the reboot cannot deny keys for the old uptime.
+  Without /dev/shm there is no default path: set EGISLAND_SHM_PATH.
+
+Limits are per host.
+
+Env:
+- EGISLAND_SHM_PATH    table file (default /dev/shm/egisland-ratelimit)
+- EGISLAND_SHM_SLOTS   slots; rounded up to a multiple of STRIPE_SLOTS (default 262144, 4 MiB)
+"""
+
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+import uuid
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .ratelimit import ALLOW, Decision, RateLimit
+
+MAGIC = b"EGRLSHM1"
+HEADER = struct.Struct("<8sQ16s")  # magic, slots, boot id
+HEADER_SIZE = 64
+SLOT = struct.Struct("<Qq")
+
+STRIPE_SLOTS = 64
+STRIPE_BYTES = STRIPE_SLOTS * SLOT.size
+PROBE = 8
+
+BOOT_ID_PATH = "/proc/sys/kernel/random/boot_id"
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def _default_path() -> str:
+    # Not tempfile.gettempdir(): /tmp may be a disk, and the table must be tmpfs-backed
+    if not os.path.isdir("/dev/shm"):
+        raise ImproperlyConfigured("No /dev/shm for the shm limiter; set EGISLAND_SHM_PATH to a tmpfs file")
+    return os.path.join("/dev/shm", "egisland-ratelimit")
+
+
+def _boot_id() -> bytes:
+    """16 bytes that change at every boot (zeros if the kernel does not say)."""
+    try:
+        with open(BOOT_ID_PATH) as f:
+            return uuid.UUID(f.read().strip()).bytes
+    except (OSError, ValueError):
+        return bytes(16)
+
+
+def _key_hash(key: str) -> int:
+    # Stable across processes (hash() is salted per process); 0 marks an empty slot.
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+
+
+class SharedMemoryLimiter:
+    def __init__(self, path: str = None, slots: int = None):
+        self.path = path or os.getenv("EGISLAND_SHM_PATH") or _default_path()
+        slots = slots or max(STRIPE_SLOTS, _env_int("EGISLAND_SHM_SLOTS", 262144))
+        self.slots = -(-slots // STRIPE_SLOTS) * STRIPE_SLOTS
+        self.stripes = self.slots // STRIPE_SLOTS
+        self._pid = None
+        self._fd = -1
+        self._map = None
+        self._thread_locks = [threading.Lock() for _ in range(self.stripes)]
+        self._open_lock = threading.Lock()
+        self._limit_params: dict = {}  # (window_seconds, max_requests) -> (interval_us, tolerance_us)
+
+    def _open(self):
+        # Per process: a forked worker maps the file again instead of sharing the fd's locks.
+        with self._open_lock:
+            if self._pid == os.getpid():
+                return self._map
+            size = HEADER_SIZE + self.slots * SLOT.size
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            boot_id = _boot_id()
+            fcntl.lockf(fd, fcntl.LOCK_EX, HEADER_SIZE, 0)
+            try:
+                if os.fstat(fd).st_size == 0:
+                    os.ftruncate(fd, size)
+                    os.pwrite(fd, HEADER.pack(MAGIC, self.slots, boot_id), 0)
+                magic, slots, table_boot_id = HEADER.unpack(os.pread(fd, HEADER.size, 0))
+                if magic != MAGIC or slots != self.slots:
+                    raise RuntimeError(
+                        f"{self.path} holds a different table ({magic!r}, {slots} slots); "
+                        "remove it or match EGISLAND_SHM_SLOTS"
+                    )
+                if table_boot_id != boot_id:
+                    # Written before a reboot: its monotonic TATs mean nothing now
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, size)
+                    os.pwrite(fd, HEADER.pack(MAGIC, self.slots, boot_id), 0)
+            finally:
+                fcntl.lockf(fd, fcntl.LOCK_UN, HEADER_SIZE, 0)
+            self._map = mmap.mmap(fd, size)
+            self._fd = fd
+            self._pid = os.getpid()
+            return self._map
+
+    def _params(self, limit: RateLimit):
+        params = self._limit_params.get((limit.window_seconds, limit.max_requests))
+        if params is None:
+            max_requests = max(1, limit.max_requests)
+            interval = max(1, max(1, limit.window_seconds) * 1_000_000 // max_requests)
+            params = self._limit_params[(limit.window_seconds, limit.max_requests)] = (
+                interval,
+                interval * max_requests,
+            )
+        return params
+
+    def hit(self, key: str, limit: RateLimit, cost: int = 1) -> Decision:
+        if self._pid != os.getpid():
+            self._open()
+        table = self._map
+        interval, tolerance = self._params(limit)
+
+        h = _key_hash(key)
+        home = h % self.slots
+        stripe = home // STRIPE_SLOTS
+        first = stripe * STRIPE_SLOTS
+        offset = home - first
+        lock_start = HEADER_SIZE + first * SLOT.size
+
+        with self._thread_locks[stripe]:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, STRIPE_BYTES, lock_start)
+            try:
+                now = time.monotonic_ns() // 1000
+                position = victim = -1
+                victim_tat = 1 << 63
+                tat = now
+                for i in range(PROBE):
+                    at = lock_start + ((offset + i) % STRIPE_SLOTS) * SLOT.size
+                    slot_hash, slot_tat = SLOT.unpack_from(table, at)
+                    if slot_hash == h:
+                        position = at
+                        if slot_tat > now:
+                            tat = slot_tat
+                        break
+                    if slot_tat < victim_tat:
+                        # Empty or expired slots (TAT <= now) win; else the one closest to expiry
+                        victim, victim_tat = at, slot_tat
+                if position < 0:
+                    position = victim
+
+                new_tat = tat + interval * cost
+                if new_tat - tolerance > now:
+                    return Decision(False, retry_after=(new_tat - tolerance - now) / 1_000_000)
+                SLOT.pack_into(table, position, h, new_tat)
+                return ALLOW
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, STRIPE_BYTES, lock_start)
+
+    async def ahit(self, key: str, limit: RateLimit, cost: int = 1) -> Decision:
+        return self.hit(key, limit, cost)
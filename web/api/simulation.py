@@ -0,0 +1,318 @@
+"""
+Vectorized Energy Island simulation core.
+
+Goal for the dissertation experiment:
+- /api/state should serve a real, moving island state so load tests include
+  realistic server-side compute, not just JSON serialization of a constant.
+
+How it works:
+- Every asset family is held as struct-of-arrays (one NumPy array per
+  attribute): generation units, demand nodes, storage units, stakeholders.
+- One tick advances every asset with a handful of vectorized operations
+  (no Python loop per asset), so thousands of assets stay well under 1 ms/tick.
+- Ticks are advanced lazily by whichever request first notices the wall clock
+  has passed the next tick boundary. No background thread is needed under
+  daphne, and readers between ticks only pay an attribute read.
+- After each advance the summary is encoded to JSON bytes once (StateSnapshot)
+  with a strong ETag, and every reader of that tick shares the same bytes.
+
+Configuration (env):
+- EGISLAND_SIM_UNITS          generation units (default 2000)
+- EGISLAND_SIM_LOADS          demand nodes (default 2000)
+- EGISLAND_SIM_STORAGE        storage units (default 200)
+- EGISLAND_SIM_TICK_SECONDS   wall-clock seconds per tick (default 1.0)
+- EGISLAND_SIM_MINUTES        simulated island minutes per tick (default 5)
+- EGISLAND_SIM_SEED           RNG seed for reproducible runs (default 7)
+
+Benchmark: python manage.py bench_sim
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+KIND_WIND = 0
+KIND_SOLAR = 1
+KIND_DIESEL = 2
+
+STAKEHOLDERS = ("gov", "ngo", "inv", "com")
+
+# Ticks we are willing to replay after an idle period; beyond this we jump.
+MAX_CATCHUP_TICKS = 32
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+@dataclass
+class SimConfig:
+    units: int = 2000
+    loads: int = 2000
+    storage: int = 200
+    tick_seconds: float = 1.0
+    sim_minutes_per_tick: float = 5.0
+    seed: int = 7
+
+    @classmethod
+    def from_env(cls) -> "SimConfig":
+        return cls(
+            units=max(3, _env_int("EGISLAND_SIM_UNITS", 2000)),
+            loads=max(1, _env_int("EGISLAND_SIM_LOADS", 2000)),
+            storage=max(1, _env_int("EGISLAND_SIM_STORAGE", 200)),
+            tick_seconds=max(0.05, _env_float("EGISLAND_SIM_TICK_SECONDS", 1.0)),
+            sim_minutes_per_tick=max(0.1, _env_float("EGISLAND_SIM_MINUTES", 5.0)),
+            seed=_env_int("EGISLAND_SIM_SEED", 7),
+        )
+
+
+@dataclass(frozen=True)
+class StateSnapshot:
+    """
+    One tick's state, encoded once and shared by all readers of that tick.
+    The ETag combines the tick with a digest of the bytes, so two workers that
+    happen to be on the same tick number never hand out the same tag for
+    different bodies.
+    """
+    tick: int
+    body: bytes
+    etag: str
+
+    @classmethod
+    def encode(cls, summary: dict) -> "StateSnapshot":
+        body = json.dumps(summary, separators=(",", ":")).encode("utf-8")
+        digest = hashlib.blake2b(body, digest_size=8).hexdigest()
+        return cls(tick=summary["tick"], body=body, etag=f'"{summary["tick"]}-{digest}"')
+
+    def matches(self, if_none_match: str) -> bool:
+        # Cheap exact compare first; fall back to parsing a list / weak tags.
+        if not if_none_match:
+            return False
+        if if_none_match == self.etag or if_none_match.strip() == "*":
+            return True
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            if tag == self.etag:
+                return True
+        return False
+
+
+class IslandSimulation:
+    """
+    Struct-of-arrays island model. Call step() to advance one tick and
+    summary() to read the aggregate state of the latest tick.
+    """
+
+    def __init__(self, config: Optional[SimConfig] = None):
+        self.config = config or SimConfig()
+        cfg = self.config
+        self.rng = np.random.default_rng(cfg.seed)
+        rng = self.rng
+
+        # --- Generation units (roughly 50% wind, 35% solar, 15% diesel)
+        self.kind = rng.choice(
+            np.array([KIND_WIND, KIND_SOLAR, KIND_DIESEL], dtype=np.int8),
+            size=cfg.units,
+            p=[0.5, 0.35, 0.15],
+        )
+        self.capacity_mw = np.where(
+            self.kind == KIND_DIESEL,
+            rng.uniform(0.5, 2.0, cfg.units),
+            rng.uniform(0.05, 0.3, cfg.units),
+        )
+        self.output_mw = np.zeros(cfg.units)
+        self.wind_speed = rng.uniform(5.0, 10.0, cfg.units)  # m/s, only used by wind
+        self.cloud = rng.uniform(0.6, 1.0, cfg.units)        # clear-sky factor, only used by solar
+        self.is_wind = self.kind == KIND_WIND
+        self.is_solar = self.kind == KIND_SOLAR
+        self.is_diesel = self.kind == KIND_DIESEL
+        self.diesel_capacity_mw = float(self.capacity_mw[self.is_diesel].sum())
+
+        # --- Demand nodes
+        self.base_mw = rng.uniform(0.02, 0.12, cfg.loads)
+        self.phase_h = rng.normal(0.0, 1.0, cfg.loads)        # per-node shift of the daily peak
+        self.demand_mw = self.base_mw.copy()
+
+        # --- Storage units
+        self.storage_capacity_mwh = rng.uniform(0.5, 4.0, cfg.storage)
+        self.storage_level_mwh = self.storage_capacity_mwh * 0.6
+        self.storage_rate_mw = self.storage_capacity_mwh * 0.5
+
+        # --- Stakeholder satisfaction (0..100), same order as STAKEHOLDERS
+        self.scores = np.array([84.0, 77.0, 69.0, 72.0])
+
+        self.tick = 0
+        self.ts = int(time.time())
+        self._summary: dict = {}
+        self.step()  # tick 1, so the first reader never sees an empty island
+
+    @property
+    def sim_hour(self) -> float:
+        return (self.tick * self.config.sim_minutes_per_tick / 60.0) % 24.0
+
+    def step(self) -> None:
+        cfg = self.config
+        rng = self.rng
+        dt_h = cfg.sim_minutes_per_tick / 60.0
+        self.tick += 1
+        hour = self.sim_hour
+
+        # --- Weather: mean-reverting wind speed and cloud cover per unit
+        self.wind_speed += 0.2 * (8.0 - self.wind_speed) + rng.normal(0.0, 0.8, cfg.units)
+        np.clip(self.wind_speed, 0.0, 30.0, out=self.wind_speed)
+        self.cloud += 0.1 * (0.8 - self.cloud) + rng.normal(0.0, 0.05, cfg.units)
+        np.clip(self.cloud, 0.1, 1.0, out=self.cloud)
+
+        # Wind power curve: cut-in 3 m/s, rated 12 m/s, cut-out 25 m/s
+        wind_cf = np.clip((self.wind_speed - 3.0) / 9.0, 0.0, 1.0) ** 3
+        wind_cf[self.wind_speed > 25.0] = 0.0
+        sun = max(0.0, float(np.sin(np.pi * (hour - 6.0) / 12.0)))
+        solar_cf = sun * self.cloud
+
+        renewable_cf = np.where(self.is_wind, wind_cf, np.where(self.is_solar, solar_cf, 0.0))
+        self.output_mw = self.capacity_mw * renewable_cf
+        renewable_mw = float(self.output_mw.sum())
+
+        # --- Demand: daily profile (evening peak) with per-node phase and noise
+        profile = 1.0 + 0.3 * np.sin(2.0 * np.pi * (hour + self.phase_h - 11.0) / 24.0)
+        self.demand_mw = self.base_mw * profile * (1.0 + rng.normal(0.0, 0.03, cfg.loads))
+        np.maximum(self.demand_mw, 0.0, out=self.demand_mw)
+        demand_mw = float(self.demand_mw.sum())
+
+        # --- Storage dispatch, shared pro rata to each unit's headroom
+        net_mw = renewable_mw - demand_mw
+        if net_mw >= 0.0:
+            room = np.minimum(self.storage_rate_mw, (self.storage_capacity_mwh - self.storage_level_mwh) / dt_h)
+        else:
+            room = np.minimum(self.storage_rate_mw, self.storage_level_mwh / dt_h)
+        room_total = float(room.sum())
+        flow_mw = min(abs(net_mw), room_total)
+        if room_total > 0.0 and flow_mw > 0.0:
+            share = room * (flow_mw / room_total)
+            self.storage_level_mwh += share * dt_h if net_mw >= 0.0 else -share * dt_h
+        storage_mw = -flow_mw if net_mw >= 0.0 else flow_mw
+
+        # --- Diesel covers what storage could not
+        deficit_mw = max(0.0, -net_mw - flow_mw) if net_mw < 0.0 else 0.0
+        diesel_mw = min(deficit_mw, self.diesel_capacity_mw)
+        if self.diesel_capacity_mw > 0.0:
+            self.output_mw[self.is_diesel] = self.capacity_mw[self.is_diesel] * (diesel_mw / self.diesel_capacity_mw)
+        unserved_mw = deficit_mw - diesel_mw
+        curtailed_mw = max(0.0, net_mw - flow_mw) if net_mw > 0.0 else 0.0
+
+        # --- Stakeholders drift towards targets driven by this tick's outcome
+        served = 1.0 - (unserved_mw / demand_mw if demand_mw > 0.0 else 0.0)
+        generation_mw = renewable_mw + diesel_mw
+        renewable_share = renewable_mw / generation_mw if generation_mw > 0.0 else 0.0
+        utilisation = 1.0 - (curtailed_mw / renewable_mw if renewable_mw > 0.0 else 0.0)
+        targets = 100.0 * np.array([
+            served,
+            renewable_share,
+            0.5 * utilisation + 0.5 * served,
+            0.7 * served + 0.3 * renewable_share,
+        ])
+        self.scores += 0.1 * (targets - self.scores)
+
+        self.ts = int(time.time())
+        self._summary = self._build_summary(generation_mw, demand_mw, storage_mw, unserved_mw)
+
+    def _build_summary(self, generation_mw: float, demand_mw: float, storage_mw: float, unserved_mw: float) -> dict:
+        capacity = float(self.storage_capacity_mwh.sum())
+        level_pct = 100.0 * float(self.storage_level_mwh.sum()) / capacity if capacity > 0.0 else 0.0
+        return {
+            "ts": self.ts,
+            "mw_generation": round(generation_mw, 2),
+            "mw_demand": round(demand_mw, 2),
+            "mw_storage_flow": round(storage_mw, 2),
+            "mw_unserved": round(unserved_mw, 2),
+            "storage": {"level_pct": round(level_pct, 1)},
+            "stakeholders": {name: int(round(v)) for name, v in zip(STAKEHOLDERS, self.scores.tolist())},
+            "tick": self.tick,
+        }
+
+    def summary(self) -> dict:
+        return self._summary
+
+
+class SimulationClock:
+    """
+    Binds an IslandSimulation to wall-clock time. current() advances any due
+    ticks (under a lock, once per tick) and returns the latest summary;
+    snapshot() returns the same tick pre-encoded.
+    """
+
+    def __init__(self, sim: IslandSimulation):
+        self.sim = sim
+        self.tick_seconds = sim.config.tick_seconds
+        self.started_at = time.monotonic()
+        self._next_tick_at = self.started_at + self.tick_seconds
+        self._lock = threading.Lock()
+        self._snapshot = StateSnapshot.encode(sim.summary())
+
+    def current(self) -> dict:
+        now = time.monotonic()
+        if now >= self._next_tick_at:
+            self._advance(now)
+        return self.sim.summary()
+
+    def snapshot(self) -> StateSnapshot:
+        now = time.monotonic()
+        if now >= self._next_tick_at:
+            self._advance(now)
+        return self._snapshot
+
+    def _advance(self, now: float) -> None:
+        with self._lock:
+            due = 1 + int((now - self.started_at) // self.tick_seconds)
+            behind = due - self.sim.tick
+            if behind <= 0:
+                return
+            if behind > MAX_CATCHUP_TICKS:
+                # Idle for a long time: skip ahead instead of replaying every tick.
+                self.sim.tick = due - MAX_CATCHUP_TICKS
+                behind = MAX_CATCHUP_TICKS
+            for _ in range(behind):
+                self.sim.step()
+            self._snapshot = StateSnapshot.encode(self.sim.summary())
+            self._next_tick_at = self.started_at + due * self.tick_seconds
+
+
+_clock: Optional[SimulationClock] = None
+_clock_lock = threading.Lock()
+
+
+def get_clock() -> SimulationClock:
+    global _clock
+    if _clock is None:
+        with _clock_lock:
+            if _clock is None:
+                _clock = SimulationClock(IslandSimulation(SimConfig.from_env()))
+    return _clock
+
+
+def current_state() -> dict:
+    return get_clock().current()
+
+
+def current_snapshot() -> StateSnapshot:
+    return get_clock().snapshot()
@@ -0,0 +1,92 @@
+"""
+Revoked JWT ids (jti) shared by all workers.
+
+Storage (Redis):
+- "egisland:jwt:revoked"  sorted set jti -> token exp (epoch); entries past
+                          exp are pruned on write, the token is dead anyway.
+                          "user:{id}" members revoke every access token of
+                          that user issued before the member was written
+                          (score = written + ACCESS_TOKEN_LIFETIME, by then
+                          all of them have expired)
+
+Each worker mirrors the live entries in a dict (jti -> exp), loaded when the
+broadcast listener (re)connects and updated by "jwt_revoke" broadcasts, so
+is_revoked() is a dict lookup on the request path (same scheme as
+blocklist.py).
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Dict
+
+from rest_framework_simplejwt.settings import api_settings
+
+from . import broadcast
+from .redis_client import get_redis
+
+INDEX_KEY = "egisland:jwt:revoked"
+
+PRUNE_AT = 10000
+
+_revoked: Dict[str, float] = {}
+_started = False
+
+
+def start() -> None:
+    global _started
+    if _started:
+        return
+    _started = True
+    broadcast.subscribe("jwt_revoke", _on_revoke)
+    broadcast.on_connect(_reload)
+
+
+def is_revoked(jti: str) -> bool:
+    exp = _revoked.get(jti)
+    if exp is None:
+        return False
+    if time.time() >= exp:
+        _revoked.pop(jti, None)
+        return False
+    return True
+
+
+def revoked_before(user_id) -> float:
+    """Epoch seconds; the user's tokens issued at or before this are revoked (0.0 if none)."""
+    exp = _revoked.get(f"user:{user_id}")
+    if exp is None or time.time() >= exp:
+        return 0.0
+    return exp - api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()
+
+
+def _remember(jti: str, exp: float) -> None:
+    if len(_revoked) >= PRUNE_AT:
+        now = time.time()
+        for k in [k for k, e in _revoked.items() if e <= now]:
+            _revoked.pop(k, None)
+    _revoked[jti] = exp
+
+
+def revoke(jti: str, exp: float) -> None:
+    _remember(jti, exp)
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.zadd(INDEX_KEY, {jti: exp})
+    pipe.zremrangebyscore(INDEX_KEY, "-inf", time.time())
+    pipe.execute()
+    broadcast.publish("jwt_revoke", {"jti": jti, "exp": exp})
+
+
+def revoke_user(user_id) -> None:
+    """Revoke every access token issued to the user so far (deactivation, deletion)."""
+    revoke(f"user:{user_id}", time.time() + api_settings.ACCESS_TOKEN_LIFETIME.total_seconds())
+
+
+def _reload() -> None:
+    global _revoked
+    rows = get_redis().zrangebyscore(INDEX_KEY, time.time(), "+inf", withscores=True)
+    _revoked = {jti.decode(): exp for jti, exp in rows}
+
+
+def _on_revoke(message: dict) -> None:
+    _remember(message["jti"], float(message["exp"]))
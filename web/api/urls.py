@@ -1,11 +1,12 @@
 from django.urls import include, path
 from .views import state_public, state_secure, ping_secure, mark
-from .auth_views import TokenObtainPairThrottledView, TokenRefreshThrottledView
+from .auth_views import LogoutView, TokenObtainPairThrottledView, TokenRefreshThrottledView
 
 urlpatterns = [
     # Auth (JWT) throttled
     path("auth/token/", TokenObtainPairThrottledView.as_view(), name="token_obtain_pair"),
     path("auth/refresh/", TokenRefreshThrottledView.as_view(), name="token_refresh"),
+    path("auth/logout/", LogoutView.as_view(), name="token_logout"),
 
     # Public (no token)
     path("state", state_public),
@@ -1,23 +1,34 @@
-from time import time
-from django.http import JsonResponse
+import json
+
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
 from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework.throttling import ScopedRateThrottle
 from .metrics_custom import experiment_marker_total
+from .permissions import CanReadState
+from .simulation import StateSnapshot, current_snapshot
+from .throttling import GcraScopedRateThrottle
+
+
+def _snapshot_response(request, snapshot: StateSnapshot, cache_control: str, wrap=None) -> HttpResponse:
+    # Conditional GET: a matching If-None-Match costs a header compare, no body.
+    if snapshot.matches(request.META.get("HTTP_IF_NONE_MATCH", "")):
+        response = HttpResponseNotModified()
+    else:
+        body = snapshot.body if wrap is None else wrap(snapshot.body)
+        response = HttpResponse(body, content_type="application/json")
+    # A wrapped body differs per caller around the same snapshot, so its tag
+    # is only weak (matches() accepts W/ tags back).
+    response["ETag"] = snapshot.etag if wrap is None else "W/" + snapshot.etag
+    response["Cache-Control"] = cache_control
+    return response
 
 
 @api_view(["GET"])
 @permission_classes([AllowAny])
-@throttle_classes([ScopedRateThrottle])
+@throttle_classes([GcraScopedRateThrottle])
 def state_public(request):
-    return JsonResponse({
-        "ts": int(time()),
-        "mw_generation": 120.5,
-        "mw_demand": 115.2,
-        "storage": {"level_pct": 62.0},
-        "stakeholders": {"gov": 84, "ngo": 77, "inv": 69, "com": 72},
-        "tick": 1,
-    })
+    # Latest tick of the island simulation, pre-encoded once per tick (see simulation.py)
+    return _snapshot_response(request, current_snapshot(), "no-cache")
 state_public.throttle_scope = "public_state"
 
 
@@ -30,17 +41,26 @@ def mark(request):
 
 
 @api_view(["GET"])
-@permission_classes([IsAuthenticated])
-@throttle_classes([ScopedRateThrottle])
+@permission_classes([CanReadState])
+@throttle_classes([GcraScopedRateThrottle])
 def state_secure(request):
-    # RBAC stub: add role checks here later
-    return JsonResponse({"ok": True, "user": str(request.user), "scope": "secure_state"})
+    # Roles come from the token's claims (permissions.py): no User load.
+    # Original payload kept for existing clients; the tick's snapshot bytes
+    # are spliced in under "state" without re-encoding them.
+    def wrap(body: bytes) -> bytes:
+        # Only called for a 200; a 304 never builds the head.
+        user = json.dumps(str(request.user)).encode("utf-8")
+        return b'{"ok":true,"user":' + user + b',"scope":"secure_state","state":' + body + b"}"
+
+    response = _snapshot_response(request, current_snapshot(), "private, no-cache", wrap=wrap)
+    response["Vary"] = "Authorization"
+    return response
 state_secure.throttle_scope = "secure"
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
-@throttle_classes([ScopedRateThrottle])
+@throttle_classes([GcraScopedRateThrottle])
 def ping_secure(request):
     return JsonResponse({"pong": True, "user": str(request.user)})
 ping_secure.throttle_scope = "secure"
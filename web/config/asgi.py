@@ -13,8 +13,11 @@ try:
 except Exception:
     websocket_urlpatterns = []
 
+# Reject blocked / rate-limited clients before the Django middleware stack
+from .edge import EdgeRejectMiddleware
+
 application = ProtocolTypeRouter({
-    "http": django_asgi_app,
+    "http": EdgeRejectMiddleware(django_asgi_app),
     "websocket": AuthMiddlewareStack(
         URLRouter(websocket_urlpatterns)
     ),
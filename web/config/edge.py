@@ -0,0 +1,103 @@
+"""
+Pure-ASGI edge filter in front of the Django HTTP app.
+
+Rejects blocked, anomalous and rate-limited clients before Django builds an
+HttpRequest or runs any middleware (Prometheus, Security, CORS, ...). It works
+from the ASGI scope only and sends pre-encoded 403/429 bodies.
+
+Uses the same DefensePolicy, blocklist, anomaly detector and limiter buckets
+as AbuseProtectionMiddleware. Requests it lets through are tagged with
+scope["egisland.edge_checked"], so the Django middleware does not count them a
+second time.
+
+Limiter calls go through limiter.ahit() and stay on the event loop: the
+"lease" backend answers from its local bucket and refills over redis.asyncio,
+"gcra" calls Redis over redis.asyncio; only "fixed" (Django cache) still runs
+in a worker thread.
+
+Disable with EGISLAND_EDGE_ENABLED=0 (the Django middleware then does the work).
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+
+from asgiref.sync import sync_to_async
+
+from api import blocklist
+from api.abuse_middleware import EDGE_CHECKED, get_policy
+
+
+def _json_body(payload: dict) -> bytes:
+    return json.dumps(payload).encode("utf-8")
+
+
+BLOCKED_BODY = _json_body({"detail": "blocked", "reason": "denylist"})
+RATE_LIMIT_BODY = _json_body({"detail": "Blocked by rate limit", "reason": "rate_limit"})
+
+
+def _scope_header(scope, name: bytes):
+    for key, value in scope.get("headers") or ():
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _scope_client_ip(scope) -> str:
+    # Same trust model as api.abuse_middleware.client_ip: first X-Forwarded-For hop.
+    xff = _scope_header(scope, b"x-forwarded-for")
+    if xff:
+        return xff.split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class EdgeRejectMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self.enabled = os.getenv("EGISLAND_EDGE_ENABLED", "1").strip().lower() in ("1", "true", "yes", "on")
+        self.policy = get_policy()
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        policy = self.policy
+        path = scope.get("path") or ""
+        rule = policy.rule_for(path)
+        if rule is None or not policy.runtime_enabled():
+            return await self.app(scope, receive, send)
+
+        ip = _scope_client_ip(scope)
+        authorization = _scope_header(scope, b"authorization")
+        policy.heavy_hitters.record(ip, path, authorization)
+        if blocklist.is_blocked(ip):
+            return await self._reject(send, 403, BLOCKED_BODY)
+        if policy.anomalous(ip, authorization):
+            client = scope.get("client")
+            escalate = blocklist.may_escalate(
+                ip, client[0] if client else None, _scope_header(scope, b"x-forwarded-for")
+            )
+            await sync_to_async(policy.quarantine, thread_sensitive=False)(ip, escalate=escalate)
+            return await self._reject(send, 403, BLOCKED_BODY)
+
+        decision = await policy.ahit(rule, ip, path, authorization)
+        if not decision.allowed:
+            return await self._reject(
+                send, policy.block_status, RATE_LIMIT_BODY, retry_after=decision.retry_after
+            )
+
+        scope[EDGE_CHECKED] = True
+        return await self.app(scope, receive, send)
+
+    async def _reject(self, send, status: int, body: bytes, retry_after: float = 0.0) -> None:
+        headers = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("ascii")),
+        ]
+        if retry_after:
+            headers.append((b"retry-after", str(max(1, math.ceil(retry_after))).encode("ascii")))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
@@ -29,6 +29,8 @@ MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "corsheaders.middleware.CorsMiddleware",   # <-- add
     "api.abuse_middleware.AbuseProtectionMiddleware",
+    # After the abuse defenses, so bad-token floods are still counted and limited
+    "api.jwt_precheck.JWTPrecheckMiddleware",  # 401 for malformed / known-bad bearer tokens
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -95,22 +97,32 @@ if not DEFENSES_ON:
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        # SimpleJWT plus a per-process cache of verified tokens (api/jwt_cache.py)
+        "api.jwt_cache.CachedJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.IsAuthenticated",  # default secure
     ),
     "DEFAULT_THROTTLE_CLASSES": [
-        "rest_framework.throttling.ScopedRateThrottle",
+        # ScopedRateThrottle semantics, one GCRA key per client (api/throttling.py)
+        "api.throttling.GcraScopedRateThrottle",
     ],
     "DEFAULT_THROTTLE_RATES": DEFAULT_THROTTLE_RATES,
 }
 
+# Password checks run in a bounded process pool (api/hash_pool.py)
+AUTHENTICATION_BACKENDS = ["api.auth_backends.PooledModelBackend"]
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=15),
     "REFRESH_TOKEN_LIFETIME": timedelta(hours=2),
-    "ROTATE_REFRESH_TOKENS": False,
+    "ROTATE_REFRESH_TOKENS": True,   # with reuse detection, api/refresh_rotation.py
     "SIGNING_KEY": SECRET_KEY,   # dev only; rotate later
+    # "roles" / "username" claims, so secure views never load the User (api/roles.py)
+    "TOKEN_OBTAIN_SERIALIZER": "api.roles.RoleTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "api.roles.RoleTokenRefreshSerializer",
+    # Token classes bound to the kid key ring (api/jwt_keys.py, EGISLAND_JWT_KEYRING)
+    "AUTH_TOKEN_CLASSES": ("api.jwt_keys.RingAccessToken",),
 }
 
 CORS_ALLOW_ALL_ORIGINS = True
@@ -119,6 +131,40 @@ CORS_ALLOWED_ORIGINS = [
     "http://127.0.0.1:8080",
 ]
 
+# Redis used by the defense layer (rate limiter, blocklists). Same instance as the channel layer.
+EGISLAND_REDIS_URL = os.getenv("EGISLAND_REDIS_URL", "redis://host.docker.internal:6379/0")
+
+# Connection pool options shared by the cache and api.redis_client.
+# Short socket timeouts: a slow Redis should trip the fallback, not stall requests.
+EGISLAND_REDIS_POOL = {
+    "max_connections": int(os.getenv("EGISLAND_REDIS_MAX_CONNECTIONS", "64")),
+    "socket_timeout": float(os.getenv("EGISLAND_REDIS_SOCKET_TIMEOUT", "0.25")),
+    "socket_connect_timeout": float(os.getenv("EGISLAND_REDIS_CONNECT_TIMEOUT", "0.25")),
+    "health_check_interval": 30,
+}
+
+# Shared cache so the abuse limiter, DRF throttles and the defense toggle agree
+# across workers (see api/cache_backend.py).
+CACHES = {
+    "default": {
+        "BACKEND": "api.cache_backend.TieredRedisCache",
+        "LOCATION": EGISLAND_REDIS_URL,
+        "TIMEOUT": 300,
+        "OPTIONS": {
+            **EGISLAND_REDIS_POOL,
+            "L1_MAX_ENTRIES": 1024,
+            "L1_TTL": 1.0,
+            "L1_PREFIXES": ("egisland:defense_enabled",),
+            "KEY_FAMILY_TTLS": {
+                "egisland:rl:": 120,          # abuse limiter counters (floor; windows set their own)
+                "throttle_": 3600,            # stock DRF throttle histories (bench_throttle)
+                "egisland:defense_enabled": None,
+            },
+            "FALLBACK": os.getenv("EGISLAND_CACHE_FALLBACK", "local"),
+            "FALLBACK_RETRY_SECONDS": 5,
+        },
+    }
+}
 
 CHANNEL_LAYERS = {
     "default": {